@@ -1,31 +1,55 @@
+import sys
 from room import Room
+from storage import RoomStorage, paused_gc
 from typing import Optional, List
 
 class AVLNode:
-    __slots__ = ['room', 'left', 'right', 'height']
+    __slots__ = ['room', 'key', 'epoch', 'left', 'right', 'height', 'size']
     
-    def __init__(self, room: Room):
+    def __init__(self, room: Room, epoch: int = 0):
         self.room = room
+        self.key = room.room_number # room number as of `epoch`
+        self.epoch = epoch
         self.left = None
         self.right = None
         self.height = 1
+        self.size = 1 # rooms in this subtree
 
     def get_balance(self):
         left_height = self.left.height if self.left else 0
         right_height = self.right.height if self.right else 0
         return left_height - right_height
 
-class AVLTree: 
+_NODE_BYTES = sys.getsizeof(AVLNode(Room(0))) + sys.getsizeof(Room(0)) # node and its Room shell
+
+class AVLTree(RoomStorage): 
     def __init__(self):
+        super().__init__() # pending shift, see RoomStorage
         self.root = None
         self._cached_size = 0
     
+    def _key(self, node):
+        # apply the shifts made since the node was last touched
+        if node.epoch != self._epoch:
+            # a * key + b keeps exponent-vector keys, key - offset would turn them into ints
+            a, b = self._transform(node.epoch)
+            node.key = a * node.key + b
+            node.epoch = self._epoch
+            node.room.room_number = node.key
+            node.room.guest_status = "old" # for visualize
+        return node.key
+    
     def _get_height(self, node):
-        return node.height
+        return node.height if node else 0
+
+    def _get_size(self, node):
+        return node.size if node else 0
 
     def _update_height(self, node):
+        # height and subtree size, both only depend on the children
         if node:
             node.height = 1 + max(self._get_height(node.left), self._get_height(node.right))
+            node.size = 1 + self._get_size(node.left) + self._get_size(node.right)
     
     def _right_rotate(self, y):
         x = y.left
@@ -46,92 +70,288 @@ class AVLTree:
         return y
     
     def balance(self, node):
+        self._update_height(node)
         balance = node.get_balance()
 
         if balance == 2:
-            if node.right and node.right.get_balance() < 0:
-                node.right = self._right_rotate(node.right)
-            node = self._left_rotate(node)
-        elif balance == -2:
-            if node.left and node.left.get_balance() > 0:
+            if node.left.get_balance() < 0:
                 node.left = self._left_rotate(node.left)
             node = self._right_rotate(node)
+        elif balance == -2:
+            if node.right.get_balance() > 0:
+                node.right = self._right_rotate(node.right)
+            node = self._left_rotate(node)
         
-        node.height = self._get_height(node)
         return node
     
     def insert(self, room: Room):
-        self.root = self._insert_recursive(self.root, room)
+        # iterative, the path down is kept on a stack and retraced upwards
+        room_number = room.room_number
+        path = []
+        node = self.root
+        while node:
+            key = self._key(node)
+            if room_number == key:
+                return # occupied, the tree is left as it is
+            path.append(node)
+            node = node.left if room_number < key else node.right
+        self._cached_size += 1
+        self._retrace(path, AVLNode(room, self._epoch), room_number, 1)
     
-    def _insert_recursive(self, node, room):
+    def _retrace(self, path, child, room_number, delta):
+        # hang `child` back under the path and rebalance bottom-up, once a subtree
+        # keeps its height the ancestors above it only need their size adjusted
+        while path:
+            parent = path.pop()
+            if room_number < parent.key:
+                parent.left = child
+            else:
+                parent.right = child
+            height = parent.height
+            child = self.balance(parent)
+            if child.height == height:
+                if path:
+                    ancestor = path[-1]
+                    if room_number < ancestor.key:
+                        ancestor.left = child
+                    else:
+                        ancestor.right = child
+                    for node in path:
+                        node.size += delta
+                    return
+                break
+        self.root = child
+    
+    def build_from_sorted(self, sorted_rooms: List[Room]):
+        # rooms must be strictly increasing by room number, replaces the current contents
+        self.root = self._build_range(sorted_rooms, 0, len(sorted_rooms))
+        self._cached_size = len(sorted_rooms)
+    
+    def _build_range(self, rooms, lo, hi):
+        # perfectly balanced subtree of rooms[lo:hi] in O(n), without slicing or recursion
+        if lo >= hi:
+            return None
+        with paused_gc():
+            root = AVLNode(rooms[(lo + hi) // 2], self._epoch)
+            stack = [(root, lo, hi)]
+            while stack:
+                node, lo, hi = stack.pop()
+                mid = (lo + hi) // 2
+                # left half is never smaller than the right one, so height only depends on the size
+                node.height = (hi - lo).bit_length()
+                node.size = hi - lo
+                if lo < mid:
+                    node.left = AVLNode(rooms[(lo + mid) // 2], self._epoch)
+                    stack.append((node.left, lo, mid))
+                if mid + 1 < hi:
+                    node.right = AVLNode(rooms[(mid + 1 + hi) // 2], self._epoch)
+                    stack.append((node.right, mid + 1, hi))
+        return root
+    
+    def bulk_load(self, sorted_rooms: List[Room]) -> List[Room]:
+        if not self.root:
+            self.build_from_sorted(sorted_rooms)
+            return []
+        return self.merge_sorted(sorted_rooms)
+    
+    def merge_sorted(self, sorted_rooms: List[Room]) -> List[Room]:
+        # union with a balanced tree of the new rooms, O(k log(n/k + 1))
+        # returns the new rooms whose number was already taken, the existing guest stays
+        collisions = []
+        other = self._build_range(sorted_rooms, 0, len(sorted_rooms))
+        self.root = self._union(self.root, other, collisions)
+        self._cached_size += len(sorted_rooms) - len(collisions)
+        return collisions
+    
+    def _union(self, node, other, collisions):
         if not node:
-            self._cached_size += 1
-            return AVLNode(room)
-        elif room.room_number > node.room.room_number:
-            node.right = self._insert_recursive(node.right, room)       
-        elif room.room_number < node.room.room_number:
-            node.left = self._insert_recursive(node.left, room)
-        node = self.balance(node)
+            return other
+        if not other:
+            return node
+        other_left, other_right = other.left, other.right
+        left, existing, right = self._split(node, self._key(other))
+        left = self._union(left, other_left, collisions)
+        right = self._union(right, other_right, collisions)
+        if existing:
+            collisions.append(other.room)
+            return self._join(left, existing, right)
+        return self._join(left, other, right)
+    
+    def _split(self, node, room_number):
+        # (keys < room_number, node holding room_number or None, keys > room_number)
+        if not node:
+            return None, None, None
+        key = self._key(node)
+        left, right = node.left, node.right
+        if room_number == key:
+            node.left = node.right = None
+            return left, node, right
+        if room_number < key:
+            less, found, greater = self._split(left, room_number)
+            return less, found, self._join(greater, node, right)
+        less, found, greater = self._split(right, room_number)
+        return self._join(left, node, less), found, greater
+    
+    def _join(self, left, node, right):
+        # every key in left < node < every key in right
+        left_height, right_height = self._get_height(left), self._get_height(right)
+        if left_height > right_height + 1:
+            left.right = self._join(left.right, node, right)
+            return self.balance(left)
+        if right_height > left_height + 1:
+            right.left = self._join(left, node, right.left)
+            return self.balance(right)
+        node.left, node.right = left, right
+        self._update_height(node)
         return node
     
     def delete(self, room_number: int):
-        self.root = self._delete_recursive(self.root, room_number)
-    
-    def _delete_recursive(self, node, room_number):
+        path = []
+        node = self.root
+        while node:
+            key = self._key(node)
+            if room_number == key:
+                break
+            path.append(node)
+            node = node.left if room_number < key else node.right
         if not node:
-            return node
+            return
+        
+        if node.left and node.right:
+            # take over the successor's room and unlink the successor instead,
+            # equal keys go right on the way back up so the path still lines up
+            path.append(node)
+            successor = node.right
+            self._key(successor)
+            while successor.left:
+                path.append(successor)
+                successor = successor.left
+                self._key(successor)
+            node.room = successor.room
+            node.key = successor.key
+            node.epoch = successor.epoch
+            room_number = successor.key
+            node = successor
         
-        if room_number < node.room.room_number:
-            node.left = self._delete_recursive(node.left, room_number)
-        elif room_number > node.room.room_number:
-            node.right = self._delete_recursive(node.right, room_number)
+        self._cached_size -= 1
+        self._retrace(path, node.left or node.right, room_number, -1)
+    
+    def delete_range(self, lo, hi) -> List[Room]:
+        # every room with lo <= room number <= hi cut out with two splits and a join, O(log n)
+        # for the tree itself, listing the removed rooms (returned in order) is O(k)
+        if not self.root or hi < lo:
+            return []
+        less, first, rest = self._split(self.root, lo)
+        middle, last, greater = self._split(rest, hi)
+        if greater:
+            # the smallest room above the range is the node the two sides are joined at
+            smallest = greater
+            while smallest.left:
+                smallest = smallest.left
+            _, pivot, greater = self._split(greater, self._key(smallest))
+            self.root = self._join(less, pivot, greater)
         else:
-            self._cached_size -= 1
-            if not node.left:
-                return node.right
-            elif not node.right:
-                return node.left
-            
-            temp = node.right
-            while temp.left:
-                temp = temp.left
-            
-            node.room = temp.room
-            node.right = self._delete_recursive(node.right, temp.room.room_number)
+            self.root = less
+        # the nodes holding lo and hi come out of _split detached
+        removed = self._subtree_rooms(first) + self._subtree_rooms(middle) + self._subtree_rooms(last)
+        self._cached_size -= len(removed)
+        return removed
 
-        node = self.balance(node)
-        return node
+    def _subtree_rooms(self, node) -> List[Room]:
+        rooms = []
+        stack = []
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            self._key(node)
+            rooms.append(node.room)
+            node = node.right
+        return rooms
     
     def search(self, room_number: int) -> Optional[Room]:
         node = self.root
         while node:
-            if room_number == node.room.room_number:
+            key = self._key(node)
+            if room_number == key:
                 return node.room
-            elif room_number < node.room.room_number:
+            elif room_number < key:
                 node = node.left
             else:
                 node = node.right
         return None
     
-    def change_room(self, n, method):
+    def _find_sorted(self, sorted_room_numbers):
+        # node (None when empty) of each room number, ascending: finger search, a lookup starts at
+        # the deepest node of the previous path whose subtree can still hold it instead of the root
         if not self.root:
-            return 
-        stack = []
-        current = self.root
-        
-        while stack or current:
-            while current:
-                if method == 1:
-                    current.room.room_number += n
-                elif method == 2:
-                    current.room.room_number *= n
-                current.room.guest_status = "old" # for visualize
-                stack.append(current)
-                current = current.left
+            for _ in sorted_room_numbers:
+                yield None
+            return
+        path = [(self.root, None)] # (node, bound): its subtree only holds room numbers below bound
+        for room_number in sorted_room_numbers:
+            while path[-1][1] is not None and room_number >= path[-1][1]:
+                path.pop()
+            node, bound = path[-1]
+            while True:
+                key = self._key(node)
+                if room_number == key:
+                    yield node
+                    break
+                if room_number < key:
+                    node, bound = node.left, key
+                else:
+                    node = node.right
+                if not node:
+                    yield None
+                    break
+                path.append((node, bound))
 
-            current = stack.pop()
-            
-            current = current.right
+    def search_sorted(self, sorted_room_numbers) -> List[Optional[Room]]:
+        return [node.room if node else None for node in self._find_sorted(sorted_room_numbers)]
+
+    def contains_sorted(self, sorted_room_numbers) -> List[bool]:
+        return [node is not None for node in self._find_sorted(sorted_room_numbers)]
+    
+    def rank(self, room_number) -> int:
+        # number of rooms below room_number, O(log n)
+        return self._count_below(room_number, False)
+
+    def select(self, index: int) -> Optional[Room]:
+        # room at 0-based position `index` in room number order, O(log n)
+        if index < 0 or index >= self._get_size(self.root):
+            return None
+        node = self.root
+        while node:
+            left_size = self._get_size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                self._key(node)
+                return node.room
+            else:
+                index -= left_size + 1
+                node = node.right
+        return None
+
+    def count_range(self, lo, hi) -> int:
+        # rooms with lo <= room number <= hi, O(log n)
+        if hi < lo:
+            return 0
+        return self._count_below(hi, True) - self._count_below(lo, False)
+
+    def _count_below(self, room_number, inclusive: bool) -> int:
+        count = 0
+        node = self.root
+        while node:
+            key = self._key(node)
+            if key < room_number or (inclusive and key == room_number):
+                count += self._get_size(node.left) + 1
+                node = node.right
+            else:
+                node = node.left
+        return count
 
     def inorder_traversal(self) -> List[Room]:
         if not self.root:
@@ -147,12 +367,33 @@ class AVLTree:
                 current = current.left
             
             current = stack.pop()
+            self._key(current)
             rooms.append(current.room)
             
             current = current.right
         
         return rooms
     
+    def iter_from(self, room_number=None):
+        # rooms in order starting at the first one >= room_number,
+        # the stack only holds the path down to it so a page costs O(log n + page)
+        stack = []
+        current = self.root
+        while current:
+            if room_number is None or self._key(current) >= room_number:
+                stack.append(current)
+                current = current.left
+            else:
+                current = current.right
+        while stack:
+            current = stack.pop()
+            self._key(current)
+            yield current.room
+            current = current.right
+            while current:
+                stack.append(current)
+                current = current.left
+    
     def print_inorder(self):
         if not self.root:
             print("Tree is empty")
@@ -165,10 +406,17 @@ class AVLTree:
                 stack.append(current)
                 current = current.left
             current = stack.pop()
+            self._key(current)
             print(current.room)
             count += 1
             current = current.right
         return count
     
+    def height(self) -> int:
+        return self._get_height(self.root)
+    
+    def memory_overhead(self) -> int:
+        return super().memory_overhead() + self._cached_size * _NODE_BYTES
+    
     def size(self) -> int:
         return self._cached_size
\ No newline at end of file
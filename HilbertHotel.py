@@ -1,131 +1,230 @@
+import functools
+import heapq
+import os
 import time
+from itertools import islice, repeat
 from typing import Optional, List
-import json
-from pympler import asizeof
+
+try:
+    import numpy as np
+except ImportError: # optional, batches are generated in plain Python without it
+    np = None
 
 from room import Room
 from AVL import AVLTree
+from storage import RoomStorage, paused_gc
+from cohort import Cohort
+from cache import LRUCache
+from bloom import MembershipFilter
+from metrics import MetricsRegistry
+from memory import MemoryModel, deep_audit
+from export import export_path, open_export, write_json, write_ndjson
+import snapshot
+from journal import Journal, replay as replay_journal
+from primes import PrimeTable
+from infinite import generate_parallel, generate_rooms, sort_rooms, top_level_units
+
+def _captured(operation: str):
+    # runs the method under metrics.capture(operation) while a capture is enabled for it
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            if not self.metrics.capturing(operation):
+                return method(self, *args, **kwargs)
+            with self.metrics.capture(operation):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorate
 
 class HilbertHotel:
     
-    def __init__(self):
-        self.rooms = AVLTree()
+    def __init__(self, symbolic_cohorts: bool = False, prime_table: Optional[PrimeTable] = None,
+                 cache_capacity: int = 1024, storage: Optional[RoomStorage] = None,
+                 metrics: Optional[MetricsRegistry] = None, workers: int = 1, verbose: bool = True,
+                 membership_filter: Optional[MembershipFilter] = None):
+        self.rooms = storage if storage is not None else AVLTree() # any RoomStorage backend
         self.total_guests = 0
-        self._room_cache = {}
-        self.prime_numbers = []
-
-    def _log_operation(self, operation: str, duration: float, details: str = "", silent: bool = False):
-        if not silent:
-            print(f"[{operation}] {duration * 1000:.4f}ms - {details}")
+        self._room_cache = LRUCache(cache_capacity)
+        self.primes = prime_table if prime_table is not None else PrimeTable.shared()
+        # batches kept as formulas, guests only become Room objects in the tree when edited
+        self.symbolic_cohorts = symbolic_cohorts
+        self.cohorts = []
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.memory = MemoryModel() # bytes held by the stored rooms, updated as they change
+        self.workers = workers # processes for infinite hierarchy generation, 0 = one per core
+        self.verbose = verbose # progress lines and per-operation logs, metrics are kept either way
+        self.journal = None # operation log, see recover()
+        self.journal_sequence = 0 # last journaled operation reflected in the hotel
+        self.checkpoint_path = None # snapshot the journal is compacted into
+        self.compact_every = 0 # checkpoint after this many journaled operations, 0 = never
+        # answers most misses without a descent, covers the room storage (cohorts check their formula)
+        self.membership_filter = membership_filter
+        if membership_filter is not None and self.rooms.size():
+            self._rebuild_filter()
+
+    def _log_operation(self, operation: str, duration_ns: int, details: str = "", silent: bool = False,
+                       rooms: int = 0):
+        # timing and counters go to the metrics registry, printing is one of its sinks
+        self.metrics.record(operation, duration_ns, details, silent or not self.verbose, rooms)
+
+    def _progress(self, message: str):
+        if self.verbose:
+            print(message)
+
+    def _journal(self, operation: str, *params):
+        # once the change is made and before it is acknowledged
+        if self.journal is None:
+            return
+        self.journal_sequence = self.journal.append(operation, *params)
+        if self.compact_every and self.journal.records_since_base() >= self.compact_every:
+            self.checkpoint()
     
-    def _calculate_room_number(self, visitor: int = 0, bus: int = 0, ship: int = 0, 
-                             fleet: int = 0, group: int = 0) -> int:
-        new_rooms = []
+    def _rebuild_filter(self):
+        size = self.rooms.size()
+        self.membership_filter.rebuild((room.room_number for room in self.rooms.iter_from()), size)
 
-        if visitor and not bus and not ship and not fleet and not group:
+    def _filter_added(self, room_numbers):
+        # after the rooms are in the storage, a filter that outgrew its size is rebuilt instead
+        if self.membership_filter is None:
+            return
+        if self.membership_filter.stale(self.rooms.size()):
+            self._rebuild_filter()
+        else:
+            self.membership_filter.add_many(room_numbers)
 
-            # shift old room by amount of passenger
+    def _filter_removed(self, room_numbers):
+        if self.membership_filter is None:
+            return
+        for room_number in room_numbers:
+            self.membership_filter.discard(room_number)
+        if self.membership_filter.stale(self.rooms.size()):
+            self._rebuild_filter()
+
+    def _stored_room(self, room_number: int) -> Optional[Room]:
+        # storage lookup, skipped when the filter rules the room out
+        membership_filter = self.membership_filter
+        if membership_filter is None:
+            return self.rooms.search(room_number)
+        if not membership_filter.might_contain(room_number):
+            return None
+        room = self.rooms.search(room_number)
+        if room is None:
+            membership_filter.false_positives += 1
+        return room
 
-            for v in range(visitor):
-                new_rooms.append(Room(v + 1, visitor_path=(0, 0, 0, 0), visitor_number = v + 1))
-        
+    def _batch_layout(self, visitor: int = 0, bus: int = 0, ship: int = 0, 
+                      fleet: int = 0, group: int = 0):
+        # every batch is room = stride * m + r for m in [0, count), r in [1, residues]
+        # m decodes into the inner containers with radices (innermost first), the rest is the visitor
+        if visitor and not bus and not ship and not fleet and not group:
+            return 1, 1, visitor, ()   # shift old room by amount of passenger
         elif bus and not ship and not fleet and not group:
-
-            # shift old room by *= bus + 1
-
-            for b in range(bus):
-                for v in range(visitor):
-                    new_rooms.append(Room((bus + 1) * v + (b + 1), visitor_path = (0, 0, 0, b + 1), visitor_number = v + 1))
-
+            return bus + 1, bus, visitor, ()   # shift old room by *= bus + 1
         elif ship and not fleet and not group:
-
-            # shift old room by *= ship + 1
-
-            for s in range(ship):
-                for b in range(bus):
-                    for v in range(visitor):
-                        new_rooms.append(Room((ship + 1) * (bus * v + b) + (s + 1), visitor_path = (0, 0, s + 1, b + 1), visitor_number = v + 1))
-
+            return ship + 1, ship, visitor * bus, (bus,)   # shift old room by *= ship + 1
         elif fleet and not group:
-
-            # shift old room by *= fleet + 1
-
-            for f in range(fleet):
-                for s in range(ship):
-                    for b in range(bus):
-                        for v in range(visitor):
-                            new_rooms.append(Room((fleet + 1) * (ship * (bus * v + b) + s) + (f + 1), visitor_path = (0, f + 1, s + 1, b + 1), visitor_number = v + 1))
-
+            return fleet + 1, fleet, visitor * bus * ship, (ship, bus)   # shift old room by *= fleet + 1
         elif group:
+            return group + 1, group, visitor * bus * ship * fleet, (fleet, ship, bus)   # shift old room by *= group + 1
+        return 1, 1, 0, ()
+
+    def _batch_columns(self, visitor: int = 0, bus: int = 0, ship: int = 0, 
+                       fleet: int = 0, group: int = 0):
+        # room number, path and visitor number columns, already sorted by room number
+        stride, residues, count, radices = self._batch_layout(visitor, bus, ship, fleet, group)
+        if count <= 0 or residues <= 0:
+            return [], [], []
+        single = stride == 1 # visitors only, path is (0, 0, 0, 0)
+        zeros = [repeat(0)] * (3 - len(radices))
+
+        if np is not None and (stride * count).bit_length() < 63:
+            m = np.arange(count, dtype=np.int64)
+            r = np.arange(1, residues + 1, dtype=np.int64)
+            room_numbers = (m * stride)[:, None] + r[None, :]
+            digits = []
+            for radix in radices:
+                digits.append(np.repeat(m % radix + 1, residues).tolist())
+                m = m // radix
+            visitor_numbers = np.repeat(m + 1, residues).tolist()
+            if single:
+                paths = [(0, 0, 0, 0)] * count
+            else:
+                paths = list(zip(*zeros, np.tile(r, count).tolist(), *digits))
+            return room_numbers.ravel().tolist(), paths, visitor_numbers
+
+        # plain Python ints when numpy is missing or the room numbers overflow int64
+        room_numbers, paths, visitor_numbers = [], [], []
+        for m in range(count):
+            q = m
+            digits = ()
+            for radix in radices:
+                digits += (q % radix + 1,)
+                q //= radix
+            base = stride * m
+            for r in range(1, residues + 1):
+                room_numbers.append(base + r)
+                paths.append((0, 0, 0, 0) if single else (0,) * len(zeros) + (r,) + digits)
+                visitor_numbers.append(q + 1)
+        return room_numbers, paths, visitor_numbers
 
-            # shift old room by *= group + 1
-            
-            for g in range(group):
-                for f in range(fleet):
-                    for s in range(ship):
-                        for b in range(bus):
-                            for v in range(visitor):
-                                new_rooms.append(Room((group + 1) * ((fleet * (ship * (bus * v + b) + s)) + f) + (g + 1), visitor_path = (g + 1, f + 1, s + 1, b + 1), visitor_number = v + 1))
-
-        return new_rooms
+    def _calculate_room_number(self, visitor: int = 0, bus: int = 0, ship: int = 0, 
+                             fleet: int = 0, group: int = 0) -> List[Room]:
+        room_numbers, paths, visitor_numbers = self._batch_columns(visitor, bus, ship, fleet, group)
+        with paused_gc():
+            return list(map(Room, room_numbers, paths, visitor_numbers))
 
     def _shift_existing_guests(self, n: int, method: int, silent: bool = False):
-        start_time = time.time()
-        self.rooms.change_room(n, method)
-        self._room_cache.clear()
-        end_time = time.time()
-        self._log_operation("SHIFT_GUESTS", end_time - start_time, "Shifted existing guests successfully")
-
-    def balance_insert(self, sorted_rooms):
+        start_time = time.perf_counter_ns()
+        shifted = self.total_rooms()
+        self.rooms.shift(n, method)
+        self.memory.shift(n, method)
+        for cohort in self.cohorts:
+            cohort.shift(n, method)
+        if self.membership_filter is not None:
+            self.membership_filter.shift(n, method)
+            if self.membership_filter.stale(self.rooms.size()):
+                self._rebuild_filter()
+
+        # cached guests move with everyone else instead of dropping the working set
+        if method == 1:
+            remap = lambda room_number: room_number + n
+        else:
+            remap = lambda room_number: room_number * n
+        self._room_cache.remap(remap)
+        for room in self._room_cache.values():
+            room.room_number = remap(room.room_number)
+            room.guest_status = "old"
+        end_time = time.perf_counter_ns()
+        self._log_operation("SHIFT_GUESTS", end_time - start_time, "Shifted existing guests successfully",
+                            silent, rooms=shifted)
+
+    def balance_insert(self, sorted_rooms) -> List[Room]:
         if not sorted_rooms:
-            return
-        mid_index = len(sorted_rooms) // 2
-        self.rooms.insert(sorted_rooms[mid_index])
-        self.balance_insert(sorted_rooms[:mid_index])
-        self.balance_insert(sorted_rooms[mid_index + 1:])
+            return []
+        collisions = self.rooms.bulk_load(sorted_rooms)
+        self.memory.add_sorted(sorted_rooms)
+        self._filter_added(room.room_number for room in sorted_rooms)
+        for room in collisions:
+            self.memory.remove_room(room)
+        if collisions:
+            shown = ", ".join(str(room.room_number) for room in collisions[:10])
+            more = "..." if len(collisions) > 10 else ""
+            self._progress(f"{len(collisions)} rooms already occupied, existing guests kept: {shown}{more}")
+        return collisions
+
+    @property
+    def prime_numbers(self):
+        return self.primes.primes
 
     def get_prime(self, index: int) -> int:
-        if index < 0:
-            raise ValueError("Index must be non-negative")
-        
-        if index < len(self.prime_numbers):
-            return self.prime_numbers[index]
-        
-        self._extend_primes_to_index(index)
-        return self.prime_numbers[index]
-    
-    def _is_prime(self, n: int) -> bool:
-        if n < 2:
-            return False
-        if n == 2:
-            return True
-        if n % 2 == 0:
-            return False
-        
-        sqrt_n = int(n ** 0.5) + 1
-        for prime in self.prime_numbers:
-            if prime >= sqrt_n:
-                break
-            if n % prime == 0:
-                return False
-            
-        start = self.prime_numbers[-1] + 2 if self.prime_numbers else 3
-        for i in range(start, sqrt_n, 2):
-            if n % i == 0:
-                return False
+        return self.primes.nth_prime(index)
         
-        return True
-    
-    def _extend_primes_to_index(self, target_index: int):
-        candidate = self.prime_numbers[-1] + 1 if self.prime_numbers else 2
-
-        while len(self.prime_numbers) <= target_index:
-            if self._is_prime(candidate):
-                self.prime_numbers.append(candidate)
-            candidate += 1
-        
-    def add_infinite(self, hierarchy_levels: int, amount_per_level: list):
-        start_time = time.time()
+    @_captured("ADD_INFINITE")
+    def add_infinite(self, hierarchy_levels: int, amount_per_level: list, workers: Optional[int] = None,
+                     chunk_units: int = 0):
+        # workers > 1 (0 = one per core) generates multi-level hierarchies in a process pool,
+        # chunk_units top-level units per task; workers=None uses the hotel's setting
+        start_time = time.perf_counter_ns()
 
         if hierarchy_levels != len(amount_per_level):
             raise ValueError(f"Hierarchy levels ({hierarchy_levels}) must match amount list length ({len(amount_per_level)}).")
@@ -133,7 +232,7 @@ class HilbertHotel:
         if hierarchy_levels <= 0:
             raise ValueError("Hierarchy levels must be positive.")
 
-        print(f"Adding infinite visitors with {hierarchy_levels}, with amount {amount_per_level} hierarchy levels")
+        self._progress(f"Adding infinite visitors with {hierarchy_levels}, with amount {amount_per_level} hierarchy levels")
 
         if hierarchy_levels > len(self.prime_numbers):
             self.get_prime(hierarchy_levels - 1)
@@ -143,11 +242,13 @@ class HilbertHotel:
             shift_prime = 2
         else:
             shift_prime = self.get_prime(hierarchy_levels)
-            print(f"Using primes: {self.prime_numbers[:hierarchy_levels]} for room generation and {shift_prime} for shifting")
+            self._progress(f"Using primes: {list(self.prime_numbers[:hierarchy_levels])} for room generation and {shift_prime} for shifting")
         
-        if self.rooms.size() > 0:
+        if self.total_rooms() > 0:
             self._shift_existing_guests(shift_prime, method, silent=True)
         
+        if workers is None:
+            workers = self.workers
         new_rooms = []
         
         if hierarchy_levels == 1: # use odd even method
@@ -164,96 +265,32 @@ class HilbertHotel:
                 for v in range(visitors_count):
                     room_number = 2 * v + 1
                     new_rooms.append(Room(room_number, visitor_path=(0, 0, 0, 0), visitor_number=v + 1))
+        elif workers == 1:
+            new_rooms = sort_rooms(generate_rooms(amount_per_level, range(top_level_units(amount_per_level))))
         else:
-            def generate_rooms_recursive(level_index, current_path, prime_powers):
-                if level_index == 0:
-
-                    level_amounts = amount_per_level[0]
-                    if isinstance(level_amounts, list):
-                        if len(current_path) > 0:
-                            container_idx = current_path[-1] - 1
-                            if container_idx < len(level_amounts):
-                                visitors_count = level_amounts[container_idx]
-                                for v in range(visitors_count):
-                                    room_number = 1
-                                    for i, power in enumerate(prime_powers):
-                                        if power > 0:
-                                            room_number *= (self.prime_numbers[i] ** power)
-                                    
-                                    room_number *= (self.prime_numbers[0] ** (v + 1))
-                                    
-                                    new_rooms.append(Room(room_number, visitor_path=current_path, visitor_number=v + 1))
-                        else:
-                            visitor_offset = 0
-                            for unit_idx, visitors_count in enumerate(level_amounts):
-                                for v in range(visitors_count):
-                                    room_number = 1
-                                    for i, power in enumerate(prime_powers):
-                                        if power > 0:
-                                            room_number *= (self.prime_numbers[i] ** power)
-                                    
-                                    room_number *= (self.prime_numbers[0] ** (visitor_offset + v + 1))
-                                    
-                                    new_rooms.append(Room(room_number, visitor_path=(unit_idx + 1,), visitor_number=v + 1))
-                                visitor_offset += visitors_count
-                    else:
-                        visitors_count = level_amounts
-                        for v in range(visitors_count):
-                            room_number = 1
-                            for i, power in enumerate(prime_powers):
-                                if power > 0:
-                                    room_number *= (self.prime_numbers[i] ** power)
-                            
-                            room_number *= (self.prime_numbers[0] ** (v + 1))
-                            
-                            new_rooms.append(Room(room_number, visitor_path=current_path, visitor_number=v + 1))
-                    return
-                
-                level_amounts = amount_per_level[level_index]
-                prime_index = level_index
-                
-                if isinstance(level_amounts, list):
-                    for unit_idx in range(len(level_amounts)):
-                        next_path = current_path + (unit_idx + 1,)
-                        
-                        new_prime_powers = prime_powers.copy()
-                        new_prime_powers[prime_index] = unit_idx + 1
-                        
-                        generate_rooms_recursive(level_index - 1, next_path, new_prime_powers)
-                else:
-                    current_level_count = level_amounts
-                    for unit in range(current_level_count):
-                        next_path = current_path + (unit + 1,)
-                        
-                        new_prime_powers = prime_powers.copy()
-                        new_prime_powers[prime_index] = unit + 1
-                        
-                        generate_rooms_recursive(level_index - 1, next_path, new_prime_powers)
-            
-            initial_prime_powers = [0] * hierarchy_levels
-            generate_rooms_recursive(hierarchy_levels - 1, (), initial_prime_powers)
-
-        print(f"Generated: {len(new_rooms)} rooms")
+            new_rooms = generate_parallel(amount_per_level, workers, chunk_units) # sorted already
 
-        new_rooms.sort(key=lambda r: r.room_number)
+        self._progress(f"Generated: {len(new_rooms)} rooms")
 
-        self.balance_insert(new_rooms)
+        if hierarchy_levels == 1:
+            new_rooms.sort(key=lambda r: r.room_number)
 
-        for room in new_rooms:
-            if len(self._room_cache) < 100:
-                self._room_cache[room.room_number] = room
+        collisions = self.balance_insert(new_rooms)
+        added = len(new_rooms) - len(collisions)
         
-        self.total_guests += len(new_rooms)
+        self.total_guests += added
+        self._journal('infinite', hierarchy_levels, amount_per_level)
         
-        end_time = time.time()
+        end_time = time.perf_counter_ns()
         self._log_operation("ADD_INFINITE", end_time - start_time, 
-                        f"Added {len(new_rooms)} visitors")
+                        f"Added {added} visitors", rooms=added)
         
-        return len(new_rooms)
+        return added
 
+    @_captured("ADD_BATCH")
     def add_batch_visitors(self, total_count: int = 0, visitors: int = 0, buses: int = 0, ships: int = 0, fleets: int = 0, groups: int = 0) -> int:
         
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         method = 2
         if groups:
             n = groups+1
@@ -267,152 +304,492 @@ class HilbertHotel:
             n = total_count
             method = 1
 
-        if self.rooms.size() > 0:
+        if self.total_rooms() > 0:
             self._shift_existing_guests(n, method, silent=True)
         
-        print(f"Adding {total_count} visitors...")
-        
-        new_rooms = self._calculate_room_number(visitors, buses, ships, fleets, groups)
-
-        print(f"Expected: {total_count}, Generated: {len(new_rooms)}")
+        self._progress(f"Adding {total_count} visitors...")
         
-        new_rooms.sort(key=lambda r: r.room_number)
+        if self.symbolic_cohorts:
+            cohort = Cohort(*self._batch_layout(visitors, buses, ships, fleets, groups))
+            added = cohort.size()
+            if added:
+                self.cohorts.append(cohort)
+            self._progress(f"Expected: {total_count}, Generated: {added} (symbolic)")
+        else:
+            new_rooms = self._calculate_room_number(visitors, buses, ships, fleets, groups)
 
-        self.balance_insert(new_rooms)
+            self._progress(f"Expected: {total_count}, Generated: {len(new_rooms)}")
 
-        for room in new_rooms:
-            if len(self._room_cache) < 100:
-                self._room_cache[room.room_number] = room
+            collisions = self.balance_insert(new_rooms)
+            added = len(new_rooms) - len(collisions)
         
-        self.total_guests += len(new_rooms)
+        self.total_guests += added
+        self._journal('batch', total_count, visitors, buses, ships, fleets, groups)
         
-        end_time = time.time()
-        self._log_operation("ADD_BATCH", end_time - start_time, f"Added {len(new_rooms)} visitors")
+        end_time = time.perf_counter_ns()
+        self._log_operation("ADD_BATCH", end_time - start_time, f"Added {added} visitors", rooms=added)
         
-        return len(new_rooms) 
+        return added
     
+    @_captured("ADD_MANUAL")
     def add_manual(self, room_number: int, visitor_path: str = "Manual entry", 
                    visitor_number = "Empty"):
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
+
+        # batches start at room 1, a lower room would not be shifted clear of the next one
+        if room_number < 1:
+            raise ValueError(f"Room numbers start at 1, got {room_number}")
+
+        if self.cohorts:
+            self.materialize_room(room_number)
 
         room = Room(room_number, visitor_path, visitor_number)
+        size_before = self.rooms.size()
         self.rooms.insert(room)
+        if self.rooms.size() == size_before: # occupied, the tree keeps the current guest
+            end_time = time.perf_counter_ns()
+            self._log_operation("ADD_MANUAL", end_time - start_time, f"Room {room_number} already occupied")
+            return
+        self.memory.add_room(room)
+        self._filter_added((room_number,))
         if visitor_number != "Empty" and visitor_number != 0:
             self.total_guests += 1
         
-        self._room_cache[room_number] = room
+        self._room_cache.put(room_number, room)
+        self._journal('add', room_number, visitor_path, visitor_number)
         
-        end_time = time.time()
-        self._log_operation("ADD_MANUAL", end_time - start_time, f"Added to room {room_number}")
+        end_time = time.perf_counter_ns()
+        self._log_operation("ADD_MANUAL", end_time - start_time, f"Added to room {room_number}", rooms=1)
     
+    @_captured("DELETE_MANUAL")
     def delete_manual(self, room_number: int):
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         
-        if room_number in self._room_cache:
-            del self._room_cache[room_number]
+        self._room_cache.pop(room_number)
 
-        room_to_delete = self.rooms.search(room_number)
+        room_to_delete = self._stored_room(room_number)
+        if room_to_delete:
+            self.rooms.delete(room_number)
+            self.memory.remove_room(room_to_delete)
+            self._filter_removed((room_number,))
+        else:
+            room_to_delete = self._cohort_remove(room_number)
 
         if room_to_delete:
             if room_to_delete.visitor_number != "Empty":
                 self.total_guests -= 1
-            self.rooms.delete(room_number)
-            end_time = time.time()
-            self._log_operation("DELETE_MANUAL", end_time - start_time, f"Deleted room {room_number}")
+            self._journal('delete', room_number)
+            end_time = time.perf_counter_ns()
+            self._log_operation("DELETE_MANUAL", end_time - start_time, f"Deleted room {room_number}", rooms=1)
             return True
         else:
-            end_time = time.time()
+            end_time = time.perf_counter_ns()
             self._log_operation("DELETE_MANUAL", end_time - start_time, f"Room {room_number} not found")
             return False
     
+    def _checked_out(self, stored: List[Room], symbolic: int):
+        # bookkeeping for rooms removed in bulk, `symbolic` guests came out of cohorts,
+        # the cache entries go in one pass by the caller
+        for room in stored:
+            self.memory.remove_room(room)
+        self._filter_removed(room.room_number for room in stored)
+        self.cohorts = [cohort for cohort in self.cohorts if cohort.size()]
+        self.total_guests -= sum(1 for room in stored if room.visitor_number != "Empty")
+        self.total_guests -= symbolic
+
+    @_captured("DELETE_RANGE")
+    def delete_range(self, lo, hi) -> int:
+        # checks out every room with lo <= room number <= hi, the tree is split around the range
+        # and joined again instead of rebalancing once per room
+        start_time = time.perf_counter_ns()
+        stored, symbolic = [], 0
+        if lo <= hi:
+            with paused_gc():
+                stored = self.rooms.delete_range(lo, hi)
+                for cohort in self.cohorts:
+                    symbolic += len(cohort.remove_range(lo, hi))
+            self._room_cache.discard_where(lambda room_number, room: lo <= room_number <= hi)
+            self._checked_out(stored, symbolic)
+        removed = len(stored) + symbolic
+        if removed:
+            self._journal('delete_range', lo, hi)
+        end_time = time.perf_counter_ns()
+        self._log_operation("DELETE_RANGE", end_time - start_time,
+                            f"Deleted {removed} rooms in [{lo}, {hi}]", rooms=removed)
+        return removed
+
+    @_captured("DELETE_COHORT")
+    def delete_cohort(self, path_prefix) -> int:
+        # checks out every guest whose visitor path starts with path_prefix, e.g. (0, 0, 3) is ship 3
+        # of a ships batch, (0, 0, 3, 2) its bus 2. paths are not ordered by room number, so this is
+        # one pass over the stored rooms: a few are deleted one by one, many mean a rebuild from the
+        # rest. symbolic cohorts work the matching guests out from their formula, none is listed
+        start_time = time.perf_counter_ns()
+        path_prefix = tuple(path_prefix)
+        if not path_prefix:
+            raise ValueError("Path prefix must not be empty")
+        depth = len(path_prefix)
+        kept, stored = [], []
+        with paused_gc():
+            for room in self.rooms.iter_from():
+                path = room.visitor_path
+                if isinstance(path, tuple) and path[:depth] == path_prefix:
+                    stored.append(room)
+                else:
+                    kept.append(room)
+            if len(stored) * max(1, self.rooms.height()) < len(kept):
+                for room in stored:
+                    self.rooms.delete(room.room_number)
+            elif stored:
+                self.rooms.build_from_sorted(kept)
+        symbolic = sum(cohort.remove_path(path_prefix) for cohort in self.cohorts)
+        self._room_cache.discard_where(lambda room_number, room: isinstance(room.visitor_path, tuple)
+                                       and room.visitor_path[:depth] == path_prefix)
+        self._checked_out(stored, symbolic)
+        removed = len(stored) + symbolic
+        if removed:
+            self._journal('delete_cohort', list(path_prefix))
+        end_time = time.perf_counter_ns()
+        self._log_operation("DELETE_COHORT", end_time - start_time,
+                            f"Deleted {removed} rooms under path {path_prefix}", rooms=removed)
+        return removed
+
+    @_captured("SEARCH_ROOM")
     def search_room(self, room_number: int) -> Optional[Room]:
-        start_time = time.time()
+        start_time = time.perf_counter_ns()
         
-        if room_number in self._room_cache:
-            room = self._room_cache[room_number]
-            end_time = time.time()
+        room = self._room_cache.get(room_number)
+        if room is not None:
+            end_time = time.perf_counter_ns()
             self._log_operation("SEARCH_ROOM", end_time - start_time, f"Room {room_number} - Found (cached)")
             return room
         
-        room = self.rooms.search(room_number)
+        room = self._stored_room(room_number)
+        if not room:
+            room = self._cohort_search(room_number)
         
         if room:
-            self._room_cache[room_number] = room
+            self._room_cache.put(room_number, room)
         
-        end_time = time.time()
+        end_time = time.perf_counter_ns()
         status = "Found" if room else "Not found"
         self._log_operation("SEARCH_ROOM", end_time - start_time, f"Room {room_number} - {status}")
         
         return room
     
+    def _sorted_lookup(self, room_numbers, found_in_storage, found_in_cohorts) -> dict:
+        # room number -> result of every distinct room number, one ascending pass over the storage
+        # for what the filter lets through, the cache is left alone: a bulk lookup would only churn it
+        distinct = sorted(set(room_numbers))
+        membership_filter = self.membership_filter
+        if membership_filter is None:
+            candidates = distinct
+        else:
+            candidates = [room_number for room_number in distinct if membership_filter.might_contain(room_number)]
+        results = dict(zip(candidates, found_in_storage(candidates)))
+        for room_number in distinct:
+            if results.get(room_number):
+                continue
+            if membership_filter is not None and room_number in results:
+                membership_filter.false_positives += 1
+            results[room_number] = found_in_cohorts(room_number)
+        return results
+
+    @_captured("SEARCH_MANY")
+    def search_many(self, room_numbers):
+        # (rooms in input order with None for empty ones, hits, misses), the keys are sorted and
+        # resolved in one finger-search pass instead of a descent and a log line per room
+        start_time = time.perf_counter_ns()
+        room_numbers = list(room_numbers)
+        with paused_gc():
+            found = self._sorted_lookup(room_numbers, self.rooms.search_sorted, self._cohort_search)
+        rooms = [found[room_number] for room_number in room_numbers]
+        hits = sum(room is not None for room in rooms)
+        end_time = time.perf_counter_ns()
+        self._log_operation("SEARCH_MANY", end_time - start_time,
+                            f"{len(rooms)} rooms - {hits} found, {len(rooms) - hits} not found", rooms=len(rooms))
+        return rooms, hits, len(rooms) - hits
+
+    @_captured("CONTAINS_MANY")
+    def contains_many(self, room_numbers):
+        # (occupied flags in input order, hits, misses), search_many without building rooms
+        start_time = time.perf_counter_ns()
+        room_numbers = list(room_numbers)
+        in_cohorts = lambda room_number: any(room_number in cohort for cohort in self.cohorts)
+        found = self._sorted_lookup(room_numbers, self.rooms.contains_sorted, in_cohorts)
+        flags = [found[room_number] for room_number in room_numbers]
+        hits = sum(flags)
+        end_time = time.perf_counter_ns()
+        self._log_operation("CONTAINS_MANY", end_time - start_time,
+                            f"{len(flags)} rooms - {hits} occupied, {len(flags) - hits} empty", rooms=len(flags))
+        return flags, hits, len(flags) - hits
+
+    def _cohort_search(self, room_number: int) -> Optional[Room]:
+        for cohort in self.cohorts:
+            room = cohort.search(room_number)
+            if room:
+                return room
+        return None
+
+    def _cohort_remove(self, room_number: int) -> Optional[Room]:
+        for cohort in self.cohorts:
+            room = cohort.remove(room_number)
+            if room:
+                if cohort.size() == 0:
+                    self.cohorts.remove(cohort)
+                return room
+        return None
+
+    def materialize_room(self, room_number: int) -> Optional[Room]:
+        # moves a symbolic guest into the room storage
+        room = self._stored_room(room_number)
+        if room:
+            return room
+        room = self._cohort_remove(room_number)
+        if room:
+            self.rooms.insert(room)
+            self.memory.add_room(room)
+            self._filter_added((room_number,))
+            self._room_cache.put(room_number, room)
+        return room
+
+    def contains(self, room_number: int) -> bool:
+        if self._stored_room(room_number):
+            return True
+        return any(room_number in cohort for cohort in self.cohorts)
+
+    def total_rooms(self) -> int:
+        return self.rooms.size() + sum(cohort.size() for cohort in self.cohorts)
+
+    def iter_rooms(self, room_number=None, rooms: Optional[RoomStorage] = None):
+        # all rooms in order from the first one >= room_number, symbolic cohorts are expanded on the fly
+        # `rooms` reads a storage snapshot instead of the live storage
+        rooms = rooms if rooms is not None else self.rooms
+        if not self.cohorts:
+            return rooms.iter_from(room_number)
+        return heapq.merge(rooms.iter_from(room_number),
+                           *(cohort.iter_from(room_number) for cohort in self.cohorts),
+                           key=lambda room: room.room_number)
+
+    def iter_range(self, lo, hi):
+        # rooms with lo <= room number <= hi
+        for room in self.iter_rooms(lo):
+            if room.room_number > hi:
+                return
+            yield room
+
+    def get_page(self, start: int, page_size: int) -> List[Room]:
+        # rooms at positions [start, start + page_size), found through select instead of a full walk
+        first = self._select(start)
+        if not first:
+            return []
+        return list(islice(self.iter_rooms(int(first.room_number)), page_size))
+
+    def _count_below(self, room_number, inclusive: bool = False) -> int:
+        count = self.rooms.count_range(0, room_number) if inclusive else self.rooms.rank(room_number)
+        return count + sum(cohort.count_below(room_number, inclusive) for cohort in self.cohorts)
+
+    def _select(self, index: int) -> Optional[Room]:
+        if index < 0 or index >= self.total_rooms():
+            return None
+        if not self.cohorts:
+            return self.rooms.select(index)
+        # smallest room number with more than `index` rooms at or below it
+        tree_size = self.rooms.size()
+        hi = max([cohort.last_room_number() for cohort in self.cohorts] +
+                 ([int(self.rooms.select(tree_size - 1).room_number)] if tree_size else []))
+        lo = 0
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._count_below(mid, True) > index:
+                hi = mid
+            else:
+                lo = mid + 1
+        return self.rooms.search(lo) or self._cohort_search(lo)
+
+    @_captured("RANK_ROOM")
+    def rank_room(self, room_number: int) -> int:
+        # how many occupied rooms come before room_number
+        start_time = time.perf_counter_ns()
+        rank = self._count_below(room_number)
+        end_time = time.perf_counter_ns()
+        self._log_operation("RANK_ROOM", end_time - start_time, f"{rank} rooms before room {room_number}")
+        return rank
+
+    @_captured("SELECT_ROOM")
+    def select_room(self, index: int) -> Optional[Room]:
+        # the index-th occupied room (0-based) in room number order
+        start_time = time.perf_counter_ns()
+        room = self._select(index)
+        end_time = time.perf_counter_ns()
+        status = f"Room {room.room_number}" if room else "Out of range"
+        self._log_operation("SELECT_ROOM", end_time - start_time, f"Position {index} - {status}")
+        return room
+
+    @_captured("COUNT_RANGE")
+    def count_range(self, lo: int, hi: int) -> int:
+        # occupied rooms with lo <= room number <= hi
+        start_time = time.perf_counter_ns()
+        count = 0
+        if lo <= hi:
+            count = self._count_below(hi, True) - self._count_below(lo)
+        end_time = time.perf_counter_ns()
+        self._log_operation("COUNT_RANGE", end_time - start_time, f"{count} rooms in [{lo}, {hi}]")
+        return count
+
+    @_captured("GET_ORDERED")
     def get_ordered_rooms(self) -> List[Room]:
-        start_time = time.time()
-        count = self.rooms.print_inorder()
-        end_time = time.time()
+        start_time = time.perf_counter_ns()
+        count = 0
+        for room in self.iter_rooms():
+            print(room)
+            count += 1
+        if not count:
+            print("Tree is empty")
+        end_time = time.perf_counter_ns()
         self._log_operation("GET_ORDERED", end_time - start_time, f"Retrieved {count} rooms")
 
-    def get_memory_usage(self) -> dict:
+    def get_memory_usage(self, deep: bool = False, sample: int = 0) -> dict:
+        # O(1) from the size model, deep=True runs the exact asizeof audit
+        # (over `sample` random rooms scaled up when sample is set)
+        if deep:
+            size = deep_audit(self, sample)
+            method = f"sampled audit ({sample} rooms)" if sample and sample < self.rooms.size() else "audit"
+        else:
+            size = self.memory.estimate(self)
+            method = "model"
         usage = {
-            'current_mb' : round(asizeof.asizeof(self) / (1024 * 1024), 4)
+            'current_mb' : round(size / (1024 * 1024), 4),
+            'method': method,
         }
         return usage
     
-    def get_resource_usage(self) -> dict:
-        start_time = time.time()
-        
-        total_rooms = self.rooms.size()
-        memory_info = self.get_memory_usage()
+    @_captured("RESOURCE_CHECK")
+    def get_resource_usage(self, deep: bool = False, sample: int = 0) -> dict:
+        start_time = time.perf_counter_ns()
         
-        def get_max_depth(node, depth=0):
-            if not node: return depth
-            return max(get_max_depth(node.left, depth + 1), get_max_depth(node.right, depth + 1))
-        
-        max_depth = get_max_depth(self.rooms.root)
+        total_rooms = self.total_rooms()
+        memory_info = self.get_memory_usage(deep, sample)
+        max_depth = self.rooms.height() # every node keeps its height, no walk needed
         
         usage_info = {
             'total_guests': self.total_guests,
             'total_rooms': total_rooms,
             'current_mb': memory_info['current_mb'],
-            'tree_nodes': total_rooms,
+            'memory_method': memory_info['method'],
+            'storage': type(self.rooms).__name__,
+            'tree_nodes': self.rooms.size(),
             'tree_max_depth': max_depth,
+            'snapshots': self.rooms.active_snapshots(),
             'cache_size': len(self._room_cache),
+            'cache_capacity': self._room_cache.capacity,
+            'cache_hits': self._room_cache.hits,
+            'cache_misses': self._room_cache.misses,
+            'cache_evictions': self._room_cache.evictions,
+            'cohorts': len(self.cohorts),
+            'membership_filter': self.membership_filter.stats() if self.membership_filter else None,
+            'journal': self.journal.stats() if self.journal else None,
+            'operations': self.metrics.as_dict()['operations'],
         }
         
-        end_time = time.time()
+        end_time = time.perf_counter_ns()
         self._log_operation("RESOURCE_CHECK", end_time - start_time, f"Mem: {usage_info['current_mb']} MB")
         return usage_info
     
-    def export_data(self, filename: str, format_type: str = 'json'):
-        start_time = time.time()
-        
-        def room_generator():
-            for room in self.rooms.inorder_traversal():
-                yield room.to_dict()
+    @_captured("EXPORT_DATA")
+    def export_data(self, filename: str, format_type: str = 'json', compression: Optional[str] = None):
+        # streams the rooms straight from the tree, nothing is collected in memory
+        # a storage with snapshots is read through one, so writes can go on during a long export
+        start_time = time.perf_counter_ns()
+        view = self.rooms.snapshot() if self.rooms.supports_snapshots else None
         
-        resource_usage = self.get_resource_usage()
-        export_data = {
-            'hotel_info': {
+        try:
+            path = export_path(filename, format_type.lower(), compression)
+            header = {
                 'total_guests': self.total_guests,
                 'export_timestamp': time.time(),
-                'total_rooms': self.rooms.size()
-            },
-            'rooms': list(room_generator()),
-            'resource_usage': f"{resource_usage['current_mb']} MB"
-        }
-        
-        try:
-            if format_type.lower() == 'json':
-                with open(f"{filename}.json", 'w', encoding='utf-8') as f:
-                    json.dump(export_data, f, indent=2, ensure_ascii=False)
-            else:
-                raise ValueError("Unsupported format")
+                'total_rooms': self.total_rooms()
+            }
+            rooms = (room.to_dict() for room in self.iter_rooms(rooms=view))
+            footer = lambda: {'resource_usage': f"{self.get_memory_usage()['current_mb']} MB"}
+
+            with open_export(path, compression) as f:
+                if format_type.lower() == 'json':
+                    count = write_json(f, header, rooms, footer)
+                else:
+                    count = write_ndjson(f, header, rooms, footer)
             
-            end_time = time.time()
-            self._log_operation("EXPORT_DATA", end_time - start_time, f"Exported to {filename}.{format_type}")
-            return True
+            end_time = time.perf_counter_ns()
+            self._log_operation("EXPORT_DATA", end_time - start_time, f"Exported {count} rooms to {path}")
+            return path
             
         except Exception as e:
-            end_time = time.time()
+            end_time = time.perf_counter_ns()
             self._log_operation("EXPORT_ERROR", end_time - start_time, f"Error: {str(e)}")
             return False
+        finally:
+            if view is not None:
+                view.release()
+
+    @_captured("SAVE_SNAPSHOT")
+    def save_snapshot(self, path: str):
+        start_time = time.perf_counter_ns()
+        try:
+            count = snapshot.save_snapshot(self, path)
+            end_time = time.perf_counter_ns()
+            self._log_operation("SAVE_SNAPSHOT", end_time - start_time, f"Saved {count} rooms to {path}")
+            return True
+        except Exception as e:
+            end_time = time.perf_counter_ns()
+            self._log_operation("SNAPSHOT_ERROR", end_time - start_time, f"Error: {str(e)}")
+            return False
 
+    @classmethod
+    def load_snapshot(cls, path: str, storage: Optional[RoomStorage] = None, **options) -> 'HilbertHotel':
+        # options are passed on to the constructor (verbose, workers, metrics, ...)
+        start_time = time.perf_counter_ns()
+        hotel = cls(storage=storage, **options)
+        count = snapshot.load_snapshot(hotel, path)
+        if hotel.membership_filter is not None:
+            hotel._rebuild_filter()
+        end_time = time.perf_counter_ns()
+        hotel._log_operation("LOAD_SNAPSHOT", end_time - start_time, f"Loaded {count} rooms from {path}")
+        return hotel
+
+    def checkpoint(self) -> bool:
+        # snapshot the hotel and empty the journal, recovery then starts from the snapshot
+        if self.journal is None or not self.checkpoint_path:
+            return False
+        self.journal.sync()
+        if not self.save_snapshot(self.checkpoint_path):
+            return False
+        self.journal.reset(self.journal_sequence)
+        return True
+
+    @classmethod
+    def recover(cls, journal_path: str, snapshot_path: Optional[str] = None, storage: Optional[RoomStorage] = None,
+                sync_interval: float = 0.0, compact_every: int = 0, **options) -> 'HilbertHotel':
+        # latest snapshot plus the operations journaled after it, the hotel keeps journaling
+        # sync_interval: seconds between journal fsyncs, compact_every: operations between checkpoints
+        start_time = time.perf_counter_ns()
+        if snapshot_path and os.path.exists(snapshot_path):
+            hotel = cls.load_snapshot(snapshot_path, storage, **options)
+        else:
+            hotel = cls(storage=storage, **options)
+        journal = Journal(journal_path, sync_interval)
+        if journal.base_sequence > hotel.journal_sequence:
+            # the operations up to the journal's base only live in a checkpoint we do not have
+            journal.close()
+            raise ValueError(f"{journal_path} was compacted past operation {journal.base_sequence}, "
+                             f"but the snapshot ({snapshot_path or 'none'}) only reaches operation "
+                             f"{hotel.journal_sequence}")
+        replayed = replay_journal(hotel, journal, hotel.journal_sequence)
+        if journal.sequence < hotel.journal_sequence:
+            journal.reset(hotel.journal_sequence) # the snapshot is newer than the log
+        hotel.journal = journal
+        hotel.checkpoint_path = snapshot_path
+        hotel.compact_every = compact_every
+        end_time = time.perf_counter_ns()
+        hotel._log_operation("RECOVER", end_time - start_time,
+                             f"Replayed {replayed} operations from {journal_path}", rooms=replayed)
+        return hotel
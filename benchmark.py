@@ -0,0 +1,261 @@
+import argparse
+import contextlib
+import csv
+import gc
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from HilbertHotel import HilbertHotel, np
+from AVL import AVLTree
+from storage import BlockStorage
+from persistent import PersistentAVLTree
+
+# standalone benchmark of the hotel's hot paths, results are written as JSON or CSV
+# so runs on different commits can be compared:
+#   python benchmark.py --scales 1e3 1e4 1e5 --output results.json
+#   python benchmark.py --scales 1e6 --only batch search --format csv --output results.csv
+
+DEFAULT_SCALES = (10**3, 10**4, 10**5)
+BENCHMARKS = ('batch', 'infinite', 'shift', 'search', 'delete', 'export', 'memory')
+STORAGES = {'avl': AVLTree, 'block': BlockStorage, 'persistent': PersistentAVLTree}
+FIELDS = ['commit', 'storage', 'benchmark', 'scale', 'params', 'guests', 'ops', 'seconds', 'us_per_op']
+MAX_QUERIES = 100000 # searches / deletes timed per run
+SHIFT_ROUNDS = 100
+HIT_RATIOS = (1.0, 0.5, 0.0)
+
+@contextlib.contextmanager
+def _quiet():
+    # anything printed despite verbose=False, the benchmark only wants its own numbers on stdout
+    with open(os.devnull, 'w') as sink, contextlib.redirect_stdout(sink):
+        yield
+
+def _timed(func, *args, **kwargs):
+    gc.collect()
+    with _quiet():
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    return seconds, result
+
+def _split_guests(scale: int, levels: int) -> list:
+    # near-equal amount per level whose product is about `scale`
+    per_level = max(1, round(scale ** (1 / levels)))
+    amounts = [per_level] * levels
+    amounts[0] = max(1, scale // per_level ** (levels - 1))
+    return amounts
+
+def _batch_args(scale: int, depth: int) -> dict:
+    # visitors, buses, ships, fleets, groups for a batch of about `scale` guests
+    names = ['visitors', 'buses', 'ships', 'fleets', 'groups'][:depth]
+    amounts = _split_guests(scale, depth)
+    args = dict(zip(names, amounts))
+    total = 1
+    for amount in amounts:
+        total *= amount
+    return dict(args, total_count=total)
+
+class Benchmark:
+    def __init__(self, storage: str = 'avl', symbolic: bool = False, seed: int = 0, repeat: int = 1):
+        self.storage = storage
+        self.symbolic = symbolic
+        self.seed = seed
+        self.repeat = repeat
+        self.commit = self._commit()
+        self.results = []
+
+    @staticmethod
+    def _commit() -> str:
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+
+    def _hotel(self) -> HilbertHotel:
+        # not verbose: the per-operation log lines would be formatted inside every timed region
+        return HilbertHotel(symbolic_cohorts=self.symbolic, storage=STORAGES[self.storage](), verbose=False)
+
+    def _filled_hotel(self, scale: int) -> HilbertHotel:
+        hotel = self._hotel()
+        with _quiet():
+            hotel.add_batch_visitors(**_batch_args(scale, 2))
+        return hotel
+
+    def _record(self, benchmark: str, scale: int, params: str, guests: int, ops: int, seconds: float):
+        self.results.append({
+            'commit': self.commit,
+            'storage': self.storage + ('+symbolic' if self.symbolic else ''),
+            'benchmark': benchmark,
+            'scale': scale,
+            'params': params,
+            'guests': guests,
+            'ops': ops,
+            'seconds': round(seconds, 6),
+            'us_per_op': round(seconds / ops * 1e6, 3) if ops else 0.0,
+        })
+        print(f"{benchmark:<10} {params:<24} scale={scale:<9} {seconds:10.4f}s", file=sys.stderr)
+
+    def _best(self, run) -> tuple:
+        # fastest of `repeat` runs, each run builds its own hotel
+        return min((run() for _ in range(self.repeat)), key=lambda result: result[0])
+
+    def bench_batch(self, scale: int):
+        for depth in range(1, 6):
+            args = _batch_args(scale, depth)
+            def run():
+                hotel = self._hotel()
+                seconds, added = _timed(hotel.add_batch_visitors, **args)
+                return seconds, added
+            seconds, added = self._best(run)
+            self._record('batch', scale, f"depth={depth}", added, added, seconds)
+            # the same batch again, existing guests are shifted and merged
+            def run_onto():
+                hotel = self._hotel()
+                with _quiet():
+                    hotel.add_batch_visitors(**args)
+                return _timed(hotel.add_batch_visitors, **args)
+            seconds, added = self._best(run_onto)
+            self._record('batch', scale, f"depth={depth},onto_existing", added, added, seconds)
+
+    def bench_infinite(self, scale: int):
+        for levels in range(1, 5):
+            amounts = _split_guests(scale, levels)
+            def run():
+                hotel = self._hotel()
+                return _timed(hotel.add_infinite, levels, amounts)
+            seconds, added = self._best(run)
+            self._record('infinite', scale, f"levels={levels}", added, added, seconds)
+
+    def bench_shift(self, scale: int):
+        # one-guest batches shift everyone, the next full walk pays for the pending shifts
+        hotel = self._filled_hotel(scale)
+        def shifts():
+            for _ in range(SHIFT_ROUNDS):
+                hotel.add_batch_visitors(1, 1)
+        seconds, _ = _timed(shifts)
+        self._record('shift', scale, f"rounds={SHIFT_ROUNDS}", hotel.total_guests, SHIFT_ROUNDS, seconds)
+        seconds, count = _timed(lambda: sum(1 for _ in hotel.iter_rooms()))
+        self._record('shift', scale, "walk_after_shifts", hotel.total_guests, count, seconds)
+
+    def bench_search(self, scale: int):
+        hotel = self._filled_hotel(scale)
+        rng = random.Random(self.seed)
+        queries = min(scale, MAX_QUERIES)
+        total = hotel.total_rooms()
+        with _quiet():
+            occupied = [hotel.select_room(rng.randrange(total)).room_number for _ in range(queries)]
+            last = hotel.select_room(total - 1).room_number
+        for ratio in HIT_RATIOS:
+            hits = int(queries * ratio)
+            keys = occupied[:hits] + [last + 1 + rng.randrange(scale) for _ in range(queries - hits)]
+            rng.shuffle(keys)
+            def run():
+                for key in keys:
+                    hotel.search_room(key)
+            seconds, _ = _timed(run)
+            self._record('search', scale, f"hit_ratio={ratio}", total, queries, seconds)
+            seconds, _ = _timed(hotel.search_many, keys)
+            self._record('search', scale, f"hit_ratio={ratio},many", total, queries, seconds)
+
+    def bench_delete(self, scale: int):
+        hotel = self._filled_hotel(scale)
+        rng = random.Random(self.seed)
+        rooms = [room.room_number for room in hotel.iter_rooms()]
+        victims = rng.sample(rooms, min(len(rooms), MAX_QUERIES))
+        def run():
+            for room_number in victims:
+                hotel.delete_manual(room_number)
+        seconds, _ = _timed(run)
+        self._record('delete', scale, "random", len(rooms), len(victims), seconds)
+
+    def bench_export(self, scale: int):
+        hotel = self._filled_hotel(scale)
+        with tempfile.TemporaryDirectory() as directory:
+            for format_type, compression in (('json', None), ('ndjson', None), ('ndjson', 'gzip')):
+                filename = os.path.join(directory, 'export')
+                seconds, path = _timed(hotel.export_data, filename, format_type, compression)
+                size = os.path.getsize(path) if path else 0
+                self._record('export', scale, f"{format_type},{compression or 'none'},{size}B",
+                             hotel.total_rooms(), hotel.total_rooms(), seconds)
+
+    def bench_memory(self, scale: int):
+        # traced bytes still held after a batch of `scale` guests, per guest
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        hotel = self._filled_hotel(scale)
+        held = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        guests = hotel.total_guests
+        self.results.append({
+            'commit': self.commit, 'storage': self.storage + ('+symbolic' if self.symbolic else ''),
+            'benchmark': 'memory', 'scale': scale, 'params': f"bytes_per_guest={held / max(guests, 1):.1f}",
+            'guests': guests, 'ops': 0, 'seconds': 0.0, 'us_per_op': 0.0, 'bytes': held,
+        })
+        print(f"{'memory':<10} {held / 2**20:.1f} MB for {guests} guests", file=sys.stderr)
+
+    def run(self, scales, benchmarks=BENCHMARKS):
+        for scale in scales:
+            for name in benchmarks:
+                getattr(self, f"bench_{name}")(scale)
+        return self.results
+
+    def meta(self) -> dict:
+        return {
+            'commit': self.commit,
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np is not None,
+            'storage': self.storage,
+            'symbolic': self.symbolic,
+            'seed': self.seed,
+            'repeat': self.repeat,
+        }
+
+def write_results(bench: Benchmark, path: str, format_type: str):
+    out = open(path, 'w', newline='') if path else sys.stdout
+    try:
+        if format_type == 'json':
+            json.dump({'meta': bench.meta(), 'results': bench.results}, out, indent=2)
+            out.write("\n")
+        else:
+            writer = csv.DictWriter(out, fieldnames=FIELDS + ['bytes'], extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(bench.results)
+    finally:
+        if path:
+            out.close()
+
+def _scale(value: str) -> int:
+    scale = int(float(value)) # accepts 1e6
+    if scale < 1:
+        raise argparse.ArgumentTypeError("Scale must be positive")
+    return scale
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Hilbert Hotel hot paths.")
+    parser.add_argument('--scales', nargs='+', type=_scale, default=list(DEFAULT_SCALES),
+                        help="guest counts to run at, e.g. 1e3 1e5 1e7")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS))
+    parser.add_argument('--storage', choices=sorted(STORAGES), default='avl')
+    parser.add_argument('--symbolic', action='store_true', help="keep batches as symbolic cohorts")
+    parser.add_argument('--repeat', type=int, default=1, help="best of N for batch and infinite runs")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--format', choices=('json', 'csv'), default='json')
+    parser.add_argument('--output', help="file to write, stdout when omitted")
+    args = parser.parse_args(argv)
+
+    bench = Benchmark(args.storage, args.symbolic, args.seed, max(1, args.repeat))
+    bench.run(args.scales, args.only)
+    write_results(bench, args.output, args.format)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import math
+import random
+from array import array
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError: # optional, bulk inserts hash one key at a time without it
+    np = None
+
+# register-blocked Bloom filter over the room numbers in the storage, a definite miss skips the
+# descent. every room sets k bits of one 64-bit word, so a lookup is one word read and one mask
+# test whatever k is, paid for with more bits per room than a classic Bloom filter (12.5 instead
+# of 9.6 at 1%, 25 instead of 14.4 at 0.1%)
+# keys are hashed shift-invariantly: the filter keeps the hotel's shifts since it was built as
+# current room number = a * origin + b (mod 2^61 - 1) and hashes origin = (room number - b) / a,
+# so a shift is O(1) and the bits never move. the hash is origin * C, folded into the frame it is
+# one multiply-add per key: hash = room number * s + d with s = C / a, d = -b * s (then an xorshift)
+# a shift by a multiple of 2^61 - 1, deletes (bits can't be cleared) and more rooms than it was
+# sized for make it stale, the hotel rebuilds it from the storage then
+#   hotel = HilbertHotel(membership_filter=MembershipFilter(fp_rate=0.001, max_bytes=64 << 20))
+
+MODULUS = (1 << 61) - 1 # Mersenne prime, room numbers are reduced into its field
+_MULTIPLIER = 0x9E3779B97F4A7C15 % MODULUS # C, consecutive origins (a batch) land far apart
+_MASKS = 1024 # precomputed bit patterns per half of a key's mask
+_MAX_HASHES = 16
+_STALE_DELETES = 0.25 # rebuild once this share of the inserted rooms has been deleted again
+
+@lru_cache(maxsize=None)
+def _mask_tables(hashes: int):
+    # a key's mask is one pattern with ceil(k/2) bits or'ed with one with floor(k/2) bits,
+    # 2^20 combinations from two small tables instead of a loop over k bit positions
+    rng = random.Random(hashes) # fixed, a rebuilt filter sets the same bits
+    high, low = (hashes + 1) // 2, hashes // 2
+    first = [sum(1 << bit for bit in rng.sample(range(64), high)) for _ in range(_MASKS)]
+    second = [sum(1 << bit for bit in rng.sample(range(64), low)) for _ in range(_MASKS)]
+    return first, second
+
+def _fp_rate(load: float, hashes: int) -> float:
+    # a word holding j rooms answers "maybe" with probability (1 - (1 - k/64)^j)^k,
+    # j is Poisson distributed around the mean load
+    if not load:
+        return 0.0
+    rate = 0.0
+    for j in range(1, int(load + 12 * math.sqrt(load)) + 20):
+        weight = math.exp(j * math.log(load) - load - math.lgamma(j + 1))
+        rate += weight * (1 - (1 - hashes / 64) ** j) ** hashes
+    return min(1.0, rate)
+
+def _best_hashes(bits_per_room: float) -> int:
+    load = 64 / bits_per_room
+    return min(range(1, _MAX_HASHES + 1), key=lambda hashes: _fp_rate(load, hashes))
+
+@lru_cache(maxsize=None)
+def _bits_per_room(fp_rate: float) -> float:
+    # fewest bits per room that reach fp_rate with the best k, by bisection (the rate falls with the bits)
+    lo, hi = 1.0, 256.0
+    for _ in range(30):
+        mid = (lo + hi) / 2
+        if _fp_rate(64 / mid, _best_hashes(mid)) > fp_rate:
+            lo = mid
+        else:
+            hi = mid
+    return hi
+
+class MembershipFilter:
+    # fp_rate: false positive rate it is sized for, capacity: rooms it is sized for (grows on rebuild)
+    # max_bytes: cap on the bit array, 0 = none, a capped filter reports the rate it really gives
+    def __init__(self, fp_rate: float = 0.01, capacity: int = 1024, max_bytes: int = 0):
+        if not 0 < fp_rate < 1:
+            raise ValueError("False positive rate must be between 0 and 1")
+        if max_bytes < 0:
+            raise ValueError("Filter memory must not be negative")
+        self.fp_rate = fp_rate
+        self.max_bytes = max_bytes
+        self.rebuilds = 0
+        self.skipped = 0 # definite misses, descents saved
+        self.false_positives = 0 # "maybe" answers the storage turned down
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int):
+        capacity = max(1, capacity)
+        words = math.ceil(capacity * _bits_per_room(self.fp_rate) / 64)
+        if self.max_bytes:
+            words = min(words, self.max_bytes // 8)
+        self.capacity = capacity
+        self.words = max(1, words)
+        self.hashes = _best_hashes(self.words * 64 / capacity)
+        self.table = array('Q', bytes(8 * self.words))
+        self._first, self._second = _mask_tables(self.hashes)
+        self.count = 0 # rooms added since the last rebuild, deleted ones included
+        self.deleted = 0
+        self._scale, self._offset = _MULTIPLIER, 0 # s and d of the frame, see above
+        self._valid = True
+
+    def _hash(self, room_number) -> int:
+        # PrimePowerKey: % works on the exponent vector, an int of it could be huge
+        if not isinstance(room_number, int):
+            room_number %= MODULUS
+        h = (room_number * self._scale + self._offset) % MODULUS
+        return h ^ h >> 29 # a linear hash alone keeps a batch's arithmetic progression in the bits
+
+    def add(self, room_number):
+        # word h % words, mask from bits 31-40 and 41-50
+        h = self._hash(room_number)
+        self.table[h % self.words] |= self._first[h >> 31 & 1023] | self._second[h >> 41 & 1023]
+        self.count += 1
+
+    def add_many(self, room_numbers):
+        if np is None:
+            for room_number in room_numbers:
+                self.add(room_number)
+            return
+        # the hashes need 122-bit products, the rest is vectorized
+        hashes = np.fromiter(map(self._hash, room_numbers), dtype=np.uint64)
+        if not len(hashes):
+            return
+        first = np.array(self._first, dtype=np.uint64)
+        second = np.array(self._second, dtype=np.uint64)
+        masks = (first[(hashes >> np.uint64(31) & np.uint64(1023)).astype(np.intp)] |
+                 second[(hashes >> np.uint64(41) & np.uint64(1023)).astype(np.intp)])
+        np.bitwise_or.at(np.frombuffer(self.table, dtype=np.uint64), hashes % np.uint64(self.words), masks)
+        self.count += len(hashes)
+
+    def might_contain(self, room_number) -> bool:
+        # False: certainly not stored, True: ask the storage
+        if not self._valid:
+            return True
+        # _hash() inlined, every lookup takes this path
+        if not isinstance(room_number, int):
+            room_number %= MODULUS
+        h = (room_number * self._scale + self._offset) % MODULUS
+        h ^= h >> 29
+        mask = self._first[h >> 31 & 1023] | self._second[h >> 41 & 1023]
+        if self.table[h % self.words] & mask == mask:
+            return True
+        self.skipped += 1
+        return False
+
+    def discard(self, room_number):
+        # the bits stay set, the room only counts towards the next rebuild
+        self.deleted += 1
+
+    def shift(self, n, method):
+        # b += n: d -= n * s, a *= n and b *= n: s /= n and d stays
+        if method == 1:
+            self._offset = (self._offset - n * self._scale) % MODULUS
+        elif method == 2:
+            n %= MODULUS
+            if not n: # no inverse, every origin would collapse to 0
+                self._valid = False
+                return
+            self._scale = self._scale * pow(n, -1, MODULUS) % MODULUS
+
+    def stale(self, size: int) -> bool:
+        # size: rooms in the storage now
+        return (not self._valid or size > self.capacity
+                or self.deleted > max(64, _STALE_DELETES * self.count))
+
+    def rebuild(self, room_numbers, size: int):
+        # sized for twice the rooms there are, so growth does not rebuild again right away
+        self._allocate(max(self.capacity, 2 * size))
+        self.add_many(room_numbers)
+        self.rebuilds += 1
+
+    def expected_fp_rate(self) -> float:
+        # for the rooms added so far
+        return _fp_rate(self.count / self.words, self.hashes)
+
+    def stats(self) -> dict:
+        return {
+            'fp_rate': self.fp_rate,
+            'expected_fp_rate': round(self.expected_fp_rate(), 6),
+            'bytes': self.words * 8,
+            'hashes': self.hashes,
+            'capacity': self.capacity,
+            'rooms': self.count,
+            'deleted': self.deleted,
+            'skipped': self.skipped,
+            'false_positives': self.false_positives,
+            'rebuilds': self.rebuilds,
+        }
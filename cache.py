@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+class LRUCache:
+    # bounded room_number -> Room cache, least recently used entry is evicted first
+    def __init__(self, capacity: int = 1024):
+        if capacity < 0:
+            raise ValueError("Capacity must be non-negative")
+        self.capacity = capacity
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        entries = self._entries
+        if key in entries:
+            entries.move_to_end(key)
+            self.hits += 1
+            return entries[key]
+        self.misses += 1
+        return default
+
+    def put(self, key, value):
+        entries = self._entries
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.capacity:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key, default=None):
+        return self._entries.pop(key, default)
+
+    def discard_where(self, predicate) -> int:
+        # drops every entry with predicate(key, value) true in one pass, the recency order is kept
+        entries = self._entries
+        kept = OrderedDict((key, value) for key, value in entries.items() if not predicate(key, value))
+        dropped = len(entries) - len(kept)
+        self._entries = kept
+        return dropped
+
+    def clear(self):
+        self._entries.clear()
+
+    def values(self):
+        return self._entries.values()
+
+    def remap(self, transform):
+        # rename every key (e.g. through a shift), the recency order is kept
+        self._entries = OrderedDict((transform(key), value) for key, value in self._entries.items())
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'capacity': self.capacity,
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+        }
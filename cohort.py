@@ -0,0 +1,196 @@
+from bisect import bisect_left, bisect_right, insort
+from heapq import merge
+from typing import Optional, List
+from room import Room
+
+class Cohort:
+    # one batch kept as its formula instead of one Room per guest:
+    # room = scale * (stride * m + r) + offset for m in [0, count), r in [1, residues]
+    __slots__ = ['stride', 'residues', 'count', 'radices', 'scale', 'offset', 'shifted', 'removed', 'cut']
+
+    def __init__(self, stride: int, residues: int, count: int, radices: tuple = ()):
+        self.stride = stride
+        self.residues = residues
+        self.count = count
+        self.radices = radices # inner containers of m, innermost first
+        self.scale = 1
+        self.offset = 0
+        self.shifted = False
+        # sorted positions (stride * m + r) of guests deleted or moved to the tree, bisected by count_below
+        self.removed = []
+        # (r, modulus, remainder) of visitor paths checked out whole: every m with m % modulus == remainder
+        # at residue r, disjoint from each other and from `removed`, see remove_path
+        self.cut = []
+
+    def size(self) -> int:
+        return self.count * self.residues - len(self.removed) - sum(map(self._rule_size, self.cut))
+
+    def _rule_size(self, rule) -> int:
+        _, modulus, remainder = rule
+        return (self.count - 1 - remainder) // modulus + 1 if remainder < self.count else 0
+
+    def _is_removed(self, position: int) -> bool:
+        i = bisect_left(self.removed, position)
+        return i < len(self.removed) and self.removed[i] == position
+
+    def _is_cut(self, m: int, r: int) -> bool:
+        return any(r == residue and m % modulus == remainder for residue, modulus, remainder in self.cut)
+
+    def shift(self, n, method):
+        if method == 1:
+            self.offset += n
+        elif method == 2:
+            self.scale *= n
+            self.offset *= n
+        self.shifted = True
+
+    def _position(self, room_number) -> Optional[int]:
+        # invert the formula, None when the room does not belong to this cohort
+        y = room_number - self.offset
+        if y <= 0 or y % self.scale:
+            return None
+        y //= self.scale
+        m, r = divmod(y - 1, self.stride)
+        if r >= self.residues or m >= self.count or self._is_removed(y) or (self.cut and self._is_cut(m, r + 1)):
+            return None
+        return y
+
+    def _room(self, position) -> Room:
+        m, r = divmod(position - 1, self.stride)
+        r += 1
+        if self.stride == 1: # visitors only
+            path = (0, 0, 0, 0)
+        else:
+            digits = ()
+            for radix in self.radices:
+                digits += (m % radix + 1,)
+                m //= radix
+            path = (0,) * (3 - len(self.radices)) + (r,) + digits
+        return Room(self.scale * position + self.offset, visitor_path=path, visitor_number=m + 1,
+                    guest_status="old" if self.shifted else "new")
+
+    def __contains__(self, room_number) -> bool:
+        return self._position(room_number) is not None
+
+    def search(self, room_number) -> Optional[Room]:
+        position = self._position(room_number)
+        return self._room(position) if position is not None else None
+
+    def remove(self, room_number) -> Optional[Room]:
+        # leaves a hole, the formula itself never changes
+        position = self._position(room_number)
+        if position is None:
+            return None
+        insort(self.removed, position)
+        return self._room(position)
+
+    def remove_range(self, lo, hi) -> List[Room]:
+        # holes for every room with lo <= room number <= hi
+        rooms = []
+        for room in self.iter_from(lo):
+            if room.room_number > hi:
+                break
+            rooms.append(room)
+        # the positions come in increasing order, one merge keeps `removed` sorted
+        positions = [(room.room_number - self.offset) // self.scale for room in rooms]
+        self.removed = list(merge(self.removed, positions))
+        return rooms
+
+    def _path_rule(self, path_prefix: tuple):
+        # guests whose visitor path starts with path_prefix: None for none of them, True for all of them,
+        # else (r, modulus, remainder). the path is the zeros, the residue r, then the digits of m
+        # innermost first, so a prefix fixes r and the lowest digits of m: m % modulus == remainder
+        if self.stride == 1: # visitors only, every path is (0, 0, 0, 0)
+            return True if len(path_prefix) <= 4 and not any(path_prefix) else None
+        zeros = 3 - len(self.radices)
+        if any(path_prefix[:zeros]):
+            return None
+        rest = path_prefix[zeros:]
+        if not rest:
+            return True
+        r, digits = rest[0], rest[1:]
+        if not 1 <= r <= self.residues or len(digits) > len(self.radices):
+            return None
+        modulus, remainder = 1, 0
+        for digit, radix in zip(digits, self.radices):
+            if not 1 <= digit <= radix:
+                return None
+            remainder += (digit - 1) * modulus
+            modulus *= radix
+        return r, modulus, remainder
+
+    def remove_path(self, path_prefix: tuple) -> int:
+        # checks out every guest whose visitor path starts with path_prefix, returns how many.
+        # nothing is listed: the guests become one rule in `cut`. two prefixes are either disjoint
+        # or one extends the other, so a rule is dropped when a wider one covers it
+        rule = self._path_rule(path_prefix)
+        if rule is None:
+            return 0
+        if rule is True:
+            removed = self.size()
+            self.count = 0 # empty, the hotel drops it
+            self.removed, self.cut = [], []
+            return removed
+        r, modulus, remainder = rule
+        covers = lambda wide, narrow: (wide[0] == narrow[0] and not narrow[1] % wide[1]
+                                       and narrow[2] % wide[1] == wide[2])
+        if any(covers(other, rule) for other in self.cut):
+            return 0
+        removed = self._rule_size(rule)
+        for other in self.cut:
+            if covers(rule, other):
+                removed -= self._rule_size(other)
+        self.cut = [other for other in self.cut if not covers(rule, other)] + [rule]
+        kept = []
+        for position in self.removed:
+            m, residue = divmod(position - 1, self.stride)
+            if residue + 1 != r or m % modulus != remainder: # holes inside the rule are counted by it now
+                kept.append(position)
+        removed -= len(self.removed) - len(kept)
+        self.removed = kept
+        return removed
+
+    def count_below(self, room_number, inclusive: bool = False) -> int:
+        # rooms below room_number (or up to it), counted from the formula
+        y = room_number - self.offset
+        last = y // self.scale if inclusive else (y - 1) // self.scale
+        last = min(last, self.stride * self.count)
+        if last <= 0:
+            return 0
+        m, r = divmod(last, self.stride)
+        removed = bisect_right(self.removed, last)
+        for residue, modulus, remainder in self.cut:
+            # m of the rule's guests at or below `last`
+            top = min((last - residue) // self.stride, self.count - 1) if last >= residue else -1
+            if top >= remainder:
+                removed += (top - remainder) // modulus + 1
+        return m * self.residues + min(r, self.residues) - removed
+
+    def last_room_number(self):
+        # upper bound, holes are not skipped
+        return self.scale * (self.stride * (self.count - 1) + self.residues) + self.offset
+
+    def iter_from(self, room_number=None):
+        # rooms in increasing order, starting at the first one >= room_number
+        start = 1
+        if room_number is not None:
+            # int(): an exponent-vector key (infinite hierarchy) has no ceiling division
+            start = max(start, -(-(int(room_number) - self.offset) // self.scale))
+        m, r = divmod(start - 1, self.stride)
+        r += 1
+        removed = self.removed
+        hole = bisect_left(removed, start) # next hole at or after the position reached
+        while m < self.count:
+            base = self.stride * m
+            for residue in range(r, self.residues + 1):
+                position = base + residue
+                if hole < len(removed) and removed[hole] == position:
+                    hole += 1
+                    continue
+                if not (self.cut and self._is_cut(m, residue)):
+                    yield self._room(position)
+            m += 1
+            r = 1
+
+    def __iter__(self):
+        return self.iter_from()
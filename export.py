@@ -0,0 +1,68 @@
+import gzip
+import json
+
+try:
+    import zstandard
+except ImportError: # optional, only needed for compression='zstd'
+    zstandard = None
+
+BUFFER_SIZE = 1 << 20
+_ROOMS_PER_WRITE = 4096
+_FORMATS = ('json', 'ndjson')
+_COMPRESSION_SUFFIX = {None: '', 'gzip': '.gz', 'zstd': '.zst'}
+
+def export_path(filename: str, format_type: str = 'json', compression: str = None) -> str:
+    if format_type not in _FORMATS:
+        raise ValueError("Unsupported format")
+    if compression not in _COMPRESSION_SUFFIX:
+        raise ValueError("Unsupported compression")
+    return f"{filename}.{format_type}{_COMPRESSION_SUFFIX[compression]}"
+
+def open_export(path: str, compression: str = None):
+    if compression == 'gzip':
+        return gzip.open(path, 'wb', compresslevel=6)
+    if compression == 'zstd':
+        if zstandard is None:
+            raise ValueError("zstd compression needs the zstandard package")
+        return zstandard.ZstdCompressor().stream_writer(open(path, 'wb', buffering=BUFFER_SIZE))
+    return open(path, 'wb', buffering=BUFFER_SIZE)
+
+def _write_lines(f, lines) -> int:
+    # joins a few thousand encoded rooms per write call, memory stays flat
+    count = 0
+    batch = []
+    for line in lines:
+        batch.append(line)
+        count += 1
+        if len(batch) >= _ROOMS_PER_WRITE:
+            f.write("".join(batch).encode('utf-8'))
+            batch.clear()
+    if batch:
+        f.write("".join(batch).encode('utf-8'))
+    return count
+
+def write_json(f, header: dict, rooms, footer) -> int:
+    # same layout as json.dump(indent=2), rooms are written as they are produced
+    # footer is called once every room is out
+    hotel_info = json.dumps(header, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+    f.write(f'{{\n  "hotel_info": {hotel_info},\n  "rooms": ['.encode('utf-8'))
+
+    def lines():
+        separator = "\n    "
+        for room in rooms:
+            yield separator + json.dumps(room, ensure_ascii=False)
+            separator = ",\n    "
+
+    count = _write_lines(f, lines())
+    closing = "\n  ]" if count else "]"
+    for key, value in footer().items():
+        closing += f",\n  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)}"
+    f.write(f"{closing}\n}}\n".encode('utf-8'))
+    return count
+
+def write_ndjson(f, header: dict, rooms, footer) -> int:
+    # first line is the hotel info, one room per line, footer last
+    f.write((json.dumps({'hotel_info': header}, ensure_ascii=False) + "\n").encode('utf-8'))
+    count = _write_lines(f, (json.dumps(room, ensure_ascii=False) + "\n" for room in rooms))
+    f.write((json.dumps(footer(), ensure_ascii=False) + "\n").encode('utf-8'))
+    return count
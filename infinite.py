@@ -0,0 +1,135 @@
+import heapq
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import List
+
+from room import Room
+from room_key import PrimePowerKey
+from storage import paused_gc
+
+# rooms of an infinite hierarchy with more than one level, room number =
+# prime(0) ** visitor * prime(1) ** unit at level 1 * ... (exponent vector keys)
+# the top level splits the work into independent subtrees, so it can be fanned out to processes
+
+_LOG_TOLERANCE = 1e-9 # PrimePowerKey only trusts logs further apart than this (relative)
+
+def _log2(room: Room) -> float:
+    return room.room_number.log2
+
+def _settle_near_ties(rooms: List[Room]) -> List[Room]:
+    # rooms ordered by log2, runs of neighbours whose logs are too close to call get the exact order
+    logs = list(map(_log2, rooms))
+    close = [i for i, (a, b) in enumerate(zip(logs, logs[1:])) if b - a <= _LOG_TOLERANCE * max(1.0, b)]
+    i = 0
+    while i < len(close):
+        start = end = close[i]
+        while i < len(close) and close[i] == end:
+            end += 1
+            i += 1
+        rooms[start:end + 1] = sorted(rooms[start:end + 1], key=lambda room: room.room_number)
+    return rooms
+
+def sort_rooms(rooms: List[Room]) -> List[Room]:
+    # sorting on the float log2 runs in C, only near ties fall back to PrimePowerKey comparisons
+    rooms.sort(key=_log2)
+    return _settle_near_ties(rooms)
+
+def top_level_units(amount_per_level: list) -> int:
+    top = amount_per_level[-1]
+    return len(top) if isinstance(top, list) else top
+
+def generate_rooms(amount_per_level: list, top_units) -> List[Room]:
+    # rooms under the top-level units in `top_units` (0-based), in generation order
+    hierarchy_levels = len(amount_per_level)
+    new_rooms = []
+
+    def generate_rooms_recursive(level_index, current_path, prime_powers):
+        if level_index == 0:
+            # exponent of prime 0 is the visitor, the rest come from the containers
+            upper_powers = tuple(prime_powers[1:])
+
+            level_amounts = amount_per_level[0]
+            if isinstance(level_amounts, list):
+                if len(current_path) > 0:
+                    container_idx = current_path[-1] - 1
+                    if container_idx < len(level_amounts):
+                        visitors_count = level_amounts[container_idx]
+                        for v in range(visitors_count):
+                            room_number = PrimePowerKey((v + 1,) + upper_powers)
+                            new_rooms.append(Room(room_number, visitor_path=current_path, visitor_number=v + 1))
+                else:
+                    visitor_offset = 0
+                    for unit_idx, visitors_count in enumerate(level_amounts):
+                        for v in range(visitors_count):
+                            room_number = PrimePowerKey((visitor_offset + v + 1,) + upper_powers)
+                            new_rooms.append(Room(room_number, visitor_path=(unit_idx + 1,), visitor_number=v + 1))
+                        visitor_offset += visitors_count
+            else:
+                visitors_count = level_amounts
+                for v in range(visitors_count):
+                    room_number = PrimePowerKey((v + 1,) + upper_powers)
+                    new_rooms.append(Room(room_number, visitor_path=current_path, visitor_number=v + 1))
+            return
+
+        level_amounts = amount_per_level[level_index]
+        prime_index = level_index
+
+        if level_index == hierarchy_levels - 1:
+            units = top_units
+        elif isinstance(level_amounts, list):
+            units = range(len(level_amounts))
+        else:
+            units = range(level_amounts)
+        for unit in units:
+            next_path = current_path + (unit + 1,)
+
+            new_prime_powers = prime_powers.copy()
+            new_prime_powers[prime_index] = unit + 1
+
+            generate_rooms_recursive(level_index - 1, next_path, new_prime_powers)
+
+    generate_rooms_recursive(hierarchy_levels - 1, (), [0] * hierarchy_levels)
+    return new_rooms
+
+def generate_run(amount_per_level: list, start: int, stop: int) -> tuple:
+    # worker: one sorted run packed into flat arrays, far cheaper to send back than Room objects
+    # (count, exponent width, exponents, paths, visitor numbers, log2 and hash of every key)
+    levels = len(amount_per_level)
+    rooms = sort_rooms(generate_rooms(amount_per_level, range(start, stop)))
+    exponents, paths, visitors = array('I'), array('I'), array('Q')
+    logs, hashes = array('d'), array('q')
+    for room in rooms:
+        key = room.room_number
+        exponents.extend(key.exponents + (0,) * (levels - len(key.exponents)))
+        paths.extend(room.visitor_path)
+        visitors.append(room.visitor_number)
+        logs.append(key.log2)
+        hashes.append(hash(key))
+    return (len(rooms), levels, exponents.tobytes(), paths.tobytes(), visitors.tobytes(),
+            logs.tobytes(), hashes.tobytes())
+
+def decode_run(run: tuple) -> List[Room]:
+    count, levels, exponents, paths, visitors, logs, hashes = run
+    exponent_column, path_column = array('I', exponents), array('I', paths)
+    visitor_column, log_column, hash_column = array('Q', visitors), array('d', logs), array('q', hashes)
+    keys = map(PrimePowerKey.from_parts, zip(*[iter(exponent_column)] * levels), log_column, hash_column)
+    return list(map(Room, keys, zip(*[iter(path_column)] * (levels - 1)), visitor_column))
+
+def generate_parallel(amount_per_level: list, workers: int = 0, chunk_units: int = 0) -> List[Room]:
+    # top-level units are split into chunks for a process pool, the sorted runs are k-way merged
+    total_units = top_level_units(amount_per_level)
+    workers = workers or os.cpu_count() or 1
+    if not chunk_units:
+        chunk_units = max(1, -(-total_units // (workers * 4))) # a few chunks per worker evens out the load
+    starts = range(0, total_units, chunk_units)
+    stops = [min(start + chunk_units, total_units) for start in starts]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        runs = list(pool.map(generate_run, repeat(amount_per_level), starts, stops))
+
+    with paused_gc():
+        decoded = [decode_run(run) for run in runs if run[0]]
+        if len(decoded) == 1:
+            return decoded[0]
+        return _settle_near_ties(list(heapq.merge(*decoded, key=_log2)))
@@ -0,0 +1,209 @@
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+
+from room_key import PrimePowerKey
+
+# append-only operation log, a hotel is its latest snapshot plus the operations journaled after it
+# file layout: magic, base sequence (the operations before it live in a snapshot), then records of
+# (payload length, crc32, sequence) + payload, the payload is the operation and its parameters as
+# compact json, a batch of a million guests is a handful of counts:
+#   ["batch",1000000,1000,1000,0,0,0]
+# a record cut short by a crash fails its length or checksum and is dropped when the file is opened,
+# as is one whose sequence does not follow the previous one (the checksum only covers the payload)
+_MAGIC = b'HHJRNL01'
+_HEADER = struct.Struct('<8sQ')
+_RECORD = struct.Struct('<IIQ')
+
+def _encode(value):
+    # room numbers of infinite hierarchies are exponent vectors
+    if isinstance(value, PrimePowerKey):
+        return {'prime_powers': list(value.exponents)}
+    raise TypeError(f"Cannot journal a {type(value).__name__}")
+
+def _decode(value: dict):
+    if 'prime_powers' in value:
+        return PrimePowerKey(value['prime_powers'])
+    return value
+
+def fsync_directory(path: str):
+    # makes a rename durable, not every platform can open a directory
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class Journal:
+    # sync_interval: seconds between fsyncs (group commit), 0 = fsync every record
+    # records appended inside one window reach the disk with a single fsync, at most
+    # one window of acknowledged operations is lost in a crash
+    def __init__(self, path: str, sync_interval: float = 0.0):
+        if sync_interval < 0:
+            raise ValueError("Sync interval must not be negative")
+        self.path = path
+        self.sync_interval = sync_interval
+        self.base_sequence = 0
+        self.sequence = 0 # last journaled operation
+        self.syncs = 0
+        self._pending = 0 # records written since the last fsync
+        self._last_sync = time.monotonic()
+        self._timer = None
+        self._lock = threading.Lock()
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            self._write_empty(path, 0)
+        self._file = open(path, 'r+b')
+        self._open_existing()
+
+    def _write_empty(self, path: str, base_sequence: int):
+        with open(path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, base_sequence))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _open_existing(self):
+        # finds the last complete record and cuts off anything after it
+        f = self._file
+        header = f.read(_HEADER.size)
+        if len(header) < _HEADER.size or header[:len(_MAGIC)] != _MAGIC:
+            f.close()
+            raise ValueError(f"{self.path} is not a hotel journal")
+        self.base_sequence = self.sequence = _HEADER.unpack(header)[1]
+        end = _HEADER.size
+        for sequence, _, _ in self._scan():
+            self.sequence = sequence
+            end = f.tell()
+        if end != os.path.getsize(self.path):
+            f.truncate(end)
+        f.seek(end)
+
+    def _scan(self):
+        f = self._file
+        expected = self.base_sequence + 1
+        while True:
+            header = f.read(_RECORD.size)
+            if len(header) < _RECORD.size:
+                return
+            length, checksum, sequence = _RECORD.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length or zlib.crc32(payload) != checksum or sequence != expected:
+                return
+            expected += 1
+            yield sequence, payload, f.tell()
+
+    def records(self, after: int = 0):
+        # (sequence, operation, parameters) of every operation journaled after `after`
+        with self._lock:
+            self._file.flush()
+            base_sequence = self.base_sequence
+            with open(self.path, 'rb') as f:
+                f.seek(_HEADER.size)
+                data = f.read()
+        offset, expected = 0, base_sequence + 1
+        while offset + _RECORD.size <= len(data):
+            length, checksum, sequence = _RECORD.unpack_from(data, offset)
+            payload = data[offset + _RECORD.size:offset + _RECORD.size + length]
+            if len(payload) < length or zlib.crc32(payload) != checksum or sequence != expected:
+                return
+            expected += 1
+            offset += _RECORD.size + length
+            if sequence > after:
+                operation, *params = json.loads(payload, object_hook=_decode)
+                yield sequence, operation, params
+
+    def append(self, operation: str, *params) -> int:
+        payload = json.dumps([operation, *params], separators=(',', ':'), default=_encode).encode('utf-8')
+        with self._lock:
+            self.sequence += 1
+            self._file.write(_RECORD.pack(len(payload), zlib.crc32(payload), self.sequence))
+            self._file.write(payload)
+            self._pending += 1
+            waited = time.monotonic() - self._last_sync
+            if waited >= self.sync_interval:
+                self._sync()
+            elif self._timer is None:
+                # an idle journal still reaches the disk at the end of the window
+                self._timer = threading.Timer(self.sync_interval - waited, self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+            return self.sequence
+
+    def _sync(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+            self.syncs += 1
+        self._last_sync = time.monotonic()
+
+    def sync(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+
+    def records_since_base(self) -> int:
+        return self.sequence - self.base_sequence
+
+    def reset(self, base_sequence: int):
+        # the operations up to base_sequence are in a snapshot now, start over with an empty log
+        with self._lock:
+            self._sync()
+            tmp_path = f"{self.path}.tmp"
+            self._write_empty(tmp_path, base_sequence)
+            self._file.close()
+            os.replace(tmp_path, self.path)
+            fsync_directory(self.path)
+            self._file = open(self.path, 'r+b')
+            self._file.seek(0, os.SEEK_END)
+            self.base_sequence = self.sequence = base_sequence
+
+    def stats(self) -> dict:
+        return {
+            'path': self.path,
+            'sequence': self.sequence,
+            'records': self.records_since_base(),
+            'syncs': self.syncs,
+            'sync_interval': self.sync_interval,
+        }
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+                self._file.close()
+
+def replay(hotel, journal: Journal, after: int) -> int:
+    # applies the operations journaled after `after` to the hotel, in order
+    count = 0
+    for sequence, operation, params in journal.records(after):
+        if operation == 'batch':
+            hotel.add_batch_visitors(*params)
+        elif operation == 'infinite':
+            hotel.add_infinite(*params)
+        elif operation == 'add':
+            room_number, visitor_path, visitor_number = params
+            if isinstance(visitor_path, list): # json has no tuples
+                visitor_path = tuple(visitor_path)
+            hotel.add_manual(room_number, visitor_path, visitor_number)
+        elif operation == 'delete':
+            hotel.delete_manual(*params)
+        elif operation == 'delete_range':
+            hotel.delete_range(*params)
+        elif operation == 'delete_cohort':
+            hotel.delete_cohort(params[0])
+        else:
+            raise ValueError(f"Unknown journal operation {operation} at {sequence}")
+        hotel.journal_sequence = sequence
+        count += 1
+    return count
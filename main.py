@@ -1,9 +1,22 @@
+import argparse
+import os
+import sys
+
 from HilbertHotel import *
+from AVL import AVLTree
+from storage import BlockStorage
+from persistent import PersistentAVLTree
+from bloom import MembershipFilter
+from primes import PrimeTable
+import replay
+
+STORAGES = {'avl': AVLTree, 'block': BlockStorage, 'persistent': PersistentAVLTree}
 
 # CLI Interface
 class HilbertHotelCLI:
-    def __init__(self):
-        self.hotel = HilbertHotel()
+    def __init__(self, hotel: Optional[HilbertHotel] = None, args=None):
+        self.hotel = hotel if hotel is not None else HilbertHotel()
+        self.args = args # command line the hotel was opened with, a loaded snapshot gets the same options
     
     def display_menu(self):
         print("\n" + "="*60)
@@ -16,6 +29,9 @@ class HilbertHotelCLI:
         print("5.  Display All Rooms")
         print("6.  Resource Usage")
         print("7.  Export Data")
+        print("8.  Save Snapshot")
+        print("9.  Load Snapshot")
+        print("10. Room Report")
         print("0.  Exit")
         print("="*60)
     
@@ -48,7 +64,7 @@ class HilbertHotelCLI:
             if room_number == 0:
                 print("Process Canceled")
                 return
-            room_number_exist = self.hotel.rooms.search(room_number)
+            room_number_exist = self.hotel.contains(room_number)
             if room_number_exist:
                 print(f"Room {room_number} already exists. Please enter a different room number.")
                 continue
@@ -216,13 +232,41 @@ class HilbertHotelCLI:
         else:
             print(f"Room {room_number} not found")
 
-    # display all room in hotel
+    # display all room in hotel, one page at a time
     def display_all_rooms(self):
         print("\nDisplay All Rooms")
         print("-" * 30)
         
-        self.hotel.get_ordered_rooms()
-        print("Output format: [Room Number: (guest visitor path) (visitor number)]")
+        total = self.hotel.total_rooms()
+        if not total:
+            print("Tree is empty")
+            return
+        page_size = self.get_int_input("Rooms per page (default: 20): ", 0) or 20
+        pages = -(-total // page_size)
+        page = 0
+        while True:
+            rooms = self.hotel.get_page(page * page_size, page_size)
+            print(f"\nPage {page + 1}/{pages} (rooms {page * page_size + 1}-{page * page_size + len(rooms)} of {total})")
+            for room in rooms:
+                print(room)
+            print("Output format: [Room Number: (guest visitor path) (visitor number)]")
+            
+            action = self.get_string_input("[n]ext, [p]rev, [j]ump to room, [q]uit: ").lower()
+            if action in ('', 'n'):
+                if page + 1 < pages:
+                    page += 1
+                else:
+                    print("Already on the last page")
+            elif action == 'p':
+                if page > 0:
+                    page -= 1
+                else:
+                    print("Already on the first page")
+            elif action == 'j':
+                room_number = self.get_int_input("Room number: ", 1)
+                page = min(self.hotel.rank_room(room_number) // page_size, pages - 1)
+            elif action == 'q':
+                break
 
 
     # show resource usage and memory analysis
@@ -230,19 +274,44 @@ class HilbertHotelCLI:
         print("\nResource Usage & Memory Analysis")
         print("-" * 50)
         
-        usage = self.hotel.get_resource_usage()
+        audit = self.get_string_input("Deep memory audit? Exact but slow on big hotels (y/n, default: n): ").lower()
+        sample = 0
+        if audit == 'y':
+            sample = self.get_int_input("Rooms to sample (0 = every room): ", 0)
+        try:
+            usage = self.hotel.get_resource_usage(deep=audit == 'y', sample=sample)
+        except ValueError as e:
+            print(e)
+            usage = self.hotel.get_resource_usage()
         
         print(f"\nHotel Stat:")
         print(f"  Total Guests: {usage['total_guests']}")
         print(f"  Total Rooms: {usage['total_rooms']}")
         
         print(f"\nMemory Usage:")
-        print(f"  Current Memory Usage: {usage['current_mb']} MB")
+        print(f"  Current Memory Usage: {usage['current_mb']} MB ({usage['memory_method']})")
 
         print(f"\nAVL Tree Stat:")
+        print(f"  Storage: {usage['storage']}")
         print(f"  Tree Nodes: {usage['tree_nodes']}")
         print(f"  Tree Max Depth: {usage['tree_max_depth']}")
-        print(f"  Cache Size: {usage['cache_size']}")
+        print(f"  Cache Size: {usage['cache_size']} / {usage['cache_capacity']}")
+        print(f"  Cache Hits / Misses / Evictions: {usage['cache_hits']} / {usage['cache_misses']} / {usage['cache_evictions']}")
+        print(f"  Symbolic Cohorts: {usage['cohorts']}")
+        print(f"  Active Snapshots: {usage['snapshots']}")
+        if usage['journal']:
+            journal = usage['journal']
+            print(f"  Journal: {journal['records']} operations since the last checkpoint, {journal['syncs']} fsyncs")
+        if usage['membership_filter']:
+            bloom = usage['membership_filter']
+            print(f"  Membership Filter: {bloom['bytes'] / (1024 * 1024):.2f} MB, {bloom['hashes']} hashes, "
+                  f"false positives {bloom['expected_fp_rate']:.4%} expected / {bloom['fp_rate']:.4%} target")
+            print(f"  Filter Misses Skipped / False Positives / Rebuilds: {bloom['skipped']} / "
+                  f"{bloom['false_positives']} / {bloom['rebuilds']}")
+
+        print(f"\nOperation Latency (ms):")
+        for operation, stats in usage['operations'].items():
+            print(f"  {operation:<15} n={stats['count']:<8} p50={stats['p50_ms']:<10} p95={stats['p95_ms']:<10} p99={stats['p99_ms']}")
         
     # export data to JSON
     def export_data(self):
@@ -253,18 +322,69 @@ class HilbertHotelCLI:
         if not filename:
             filename = f"hilbert_hotel_{int(time.time())}"
         
-        if self.hotel.export_data(filename, format_type='json'):
-            print(f"Data exported to {filename}.json")
+        format_type = self.get_string_input("Format (json/ndjson, default: json): ").lower() or 'json'
+        compression = self.get_string_input("Compression (none/gzip/zstd, default: none): ").lower()
+        if compression in ('', 'none'):
+            compression = None
+        
+        path = self.hotel.export_data(filename, format_type=format_type, compression=compression)
+        if path:
+            print(f"Data exported to {path}")
         else:
             print("Export failed")
     
+    # save binary snapshot
+    def save_snapshot(self):
+        print("\nSave Snapshot")
+        print("-" * 30)
+        
+        path = self.get_string_input("Snapshot file (default: hilbert_hotel.snap): ") or "hilbert_hotel.snap"
+        if self.hotel.save_snapshot(path):
+            print(f"Snapshot saved to {path}")
+        else:
+            print("Snapshot failed")
+    
+    # replace the hotel with a saved snapshot
+    def load_snapshot(self):
+        print("\nLoad Snapshot")
+        print("-" * 30)
+        
+        path = self.get_string_input("Snapshot file (default: hilbert_hotel.snap): ") or "hilbert_hotel.snap"
+        try:
+            self.hotel = reload_hotel(self.hotel, path, self.args)
+        except (OSError, ValueError) as e:
+            print(f"Load failed: {e}")
+            return
+        print(f"Loaded {self.hotel.total_rooms()} rooms from {path}")
+    
+    # rank, k-th room and range count
+    def room_report(self):
+        print("\nRoom Report")
+        print("-" * 30)
+        
+        choice = self.get_int_input("Choose report (1-3):\n1. Position of a room\n2. Room at position\n3. Rooms in range\nYour choice: ", 1, 3)
+        if choice == 1:
+            room_number = self.get_int_input("Room number: ", 1)
+            print(f"{self.hotel.rank_room(room_number)} occupied rooms come before room {room_number}")
+        elif choice == 2:
+            position = self.get_int_input("Position (1 = first room): ", 1)
+            room = self.hotel.select_room(position - 1)
+            if room:
+                print(f"Found: {room}")
+            else:
+                print(f"Only {self.hotel.total_rooms()} rooms are occupied")
+        elif choice == 3:
+            lo = self.get_int_input("From room: ", 1)
+            hi = self.get_int_input("To room: ", lo)
+            print(f"{self.hotel.count_range(lo, hi)} occupied rooms between {lo} and {hi}")
+    
     # main input manager
     def run(self):
         print("Hotel Management System")
         
         while True:
             self.display_menu()
-            choice = self.get_int_input("Enter your choice (0-7): ", 0, 7)
+            choice = self.get_int_input("Enter your choice (0-10): ", 0, 10)
             
             try:
                 if choice == 0:
@@ -284,6 +404,12 @@ class HilbertHotelCLI:
                     self.show_resource_usage()
                 elif choice == 7:
                     self.export_data()
+                elif choice == 8:
+                    self.save_snapshot()
+                elif choice == 9:
+                    self.load_snapshot()
+                elif choice == 10:
+                    self.room_report()
                 
                 input("\nPress Enter to continue...")
                 
@@ -291,6 +417,170 @@ class HilbertHotelCLI:
                 print("\n\nExited")
                 break
 
+# scripted use, the same operations without the menu:
+#   python main.py                                   interactive menu
+#   python main.py replay ops.txt                    run a file of commands (- or nothing = stdin)
+#   python main.py --snapshot hotel.snap add-batch 100 10
+#   python main.py --snapshot hotel.snap search 12
+#   python main.py --journal hotel.log --snapshot hotel.snap --compact-every 1000 replay ops.txt
+# the replay file format is described in replay.py
+def add_hotel_arguments(parser: argparse.ArgumentParser):
+    # how the hotel is built and where it is kept, shared with server.py
+    parser.add_argument('--storage', choices=sorted(STORAGES), default='avl')
+    parser.add_argument('--symbolic', action='store_true', help="keep batches as symbolic cohorts")
+    parser.add_argument('--workers', type=int, default=1, help="processes for add-infinite, 0 = one per core")
+    parser.add_argument('--snapshot', help="loaded at start when it exists, saved again at the end "
+                                           "(with --journal: the checkpoint the journal is compacted into)")
+    parser.add_argument('--journal', help="operation log replayed at start and appended to")
+    parser.add_argument('--sync-interval', type=float, default=0.0,
+                        help="milliseconds between journal fsyncs (group commit), 0 = every operation")
+    parser.add_argument('--compact-every', type=int, default=0,
+                        help="checkpoint the journal into --snapshot after this many operations, 0 = never")
+    parser.add_argument('--filter', type=float, default=0.0, metavar='FP_RATE',
+                        help="answer misses from a membership filter with this false positive rate, 0 = no filter")
+    parser.add_argument('--filter-max-mb', type=float, default=0.0, help="memory cap of the filter, 0 = none")
+    parser.add_argument('--primes', metavar='PATH',
+                        help="prime table loaded at start when it exists, saved again at the end when it grew")
+    parser.add_argument('--profile', action='append', default=[], metavar='OPERATION',
+                        help="run OPERATION (e.g. ADD_BATCH) under cProfile and tracemalloc, repeatable")
+    parser.add_argument('--verbose', action='store_true', help="keep the hotel's per-operation log")
+
+def hotel_options(args, verbose: bool) -> dict:
+    # constructor options from the command line, storage aside
+    options = {'symbolic_cohorts': args.symbolic, 'workers': args.workers, 'verbose': verbose}
+    if args.primes:
+        options['prime_table'] = PrimeTable.open(args.primes)
+    if args.filter:
+        options['membership_filter'] = MembershipFilter(args.filter, max_bytes=int(args.filter_max_mb * 1024 * 1024))
+    if args.profile:
+        options['metrics'] = MetricsRegistry()
+        for operation in args.profile:
+            options['metrics'].enable_capture(operation.upper(), profile=True, memory=True)
+    return options
+
+def open_hotel(args, verbose: bool) -> HilbertHotel:
+    storage = STORAGES[args.storage]()
+    options = hotel_options(args, verbose)
+    if args.journal:
+        return HilbertHotel.recover(args.journal, args.snapshot, storage, args.sync_interval / 1000,
+                                    max(0, args.compact_every), **options)
+    if args.snapshot and os.path.exists(args.snapshot):
+        return HilbertHotel.load_snapshot(args.snapshot, storage, **options)
+    return HilbertHotel(storage=storage, **options)
+
+def reload_hotel(hotel: HilbertHotel, path: str, args=None) -> HilbertHotel:
+    # the snapshot at path in place of `hotel`, built with the same command line options. a journaled
+    # hotel hands its journal over and checkpoints right away: the journal holds the old hotel's
+    # operations, recovery has to start from the loaded rooms instead
+    if hotel.journal is not None and not hotel.checkpoint_path:
+        raise ValueError("The journal has no --snapshot to checkpoint the loaded hotel into")
+    if args is None:
+        if hotel.journal is not None:
+            raise ValueError("A journaled hotel can only load snapshots opened from the command line")
+        return HilbertHotel.load_snapshot(path, verbose=hotel.verbose)
+    options = hotel_options(args, hotel.verbose)
+    options['metrics'] = hotel.metrics # the session's timings and --profile captures go on
+    loaded = HilbertHotel.load_snapshot(path, STORAGES[args.storage](), **options)
+    if hotel.journal is not None:
+        loaded.journal = hotel.journal
+        loaded.journal_sequence = hotel.journal.sequence
+        loaded.checkpoint_path = hotel.checkpoint_path
+        loaded.compact_every = hotel.compact_every
+        if not loaded.checkpoint():
+            raise ValueError(f"Could not checkpoint the loaded hotel into {hotel.checkpoint_path}")
+    return loaded
+
+def write_profiles(hotel: HilbertHotel, out=None):
+    # the last capture of every --profile operation that ran, a capture nested in another one
+    # (a checkpoint in a batch) is part of the outer profile and only has its memory numbers
+    out = out or sys.stderr
+    for operation, result in sorted(hotel.metrics.profiles.items()):
+        print(f"== {operation}: current {result['memory_current_bytes']} bytes, "
+              f"peak {result['memory_peak_bytes']} bytes", file=out)
+        if 'profile' in result:
+            print(result['profile'], file=out)
+
+def open_hotel_or_exit(args, verbose: bool) -> HilbertHotel:
+    # a journal that cannot be recovered or a broken snapshot ends the program with the reason
+    try:
+        return open_hotel(args, verbose)
+    except (OSError, ValueError) as e:
+        sys.exit(f"Cannot open the hotel: {e}")
+
+def close_hotel(hotel: HilbertHotel, snapshot_path: Optional[str], changed: bool = True,
+                primes_path: Optional[str] = None) -> bool:
+    # with a journal every operation is on disk already, otherwise the snapshot is rewritten
+    if primes_path and hotel.primes.limit > PrimeTable.saved_limit(primes_path):
+        try:
+            hotel.primes.save(primes_path)
+        except OSError as e:
+            print(f"Could not save the prime table to {primes_path}: {e}", file=sys.stderr)
+    if hotel.journal is not None:
+        hotel.journal.close()
+        return True
+    if snapshot_path and changed:
+        if not hotel.save_snapshot(snapshot_path):
+            print(f"Could not save the snapshot to {snapshot_path}", file=sys.stderr)
+            return False
+    return True
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Hilbert Hotel management system.")
+    add_hotel_arguments(parser)
+    parser.add_argument('--results', action='store_true', help="print each command's result at the end")
+    parser.add_argument('--report', choices=('text', 'json'), default='text')
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('menu', help="interactive menu (default)")
+    replay_parser = commands.add_parser('replay', help="run commands from a file or stdin")
+    replay_parser.add_argument('file', nargs='?', default='-')
+    replay_parser.add_argument('--stop-on-error', action='store_true')
+    batch = commands.add_parser('add-batch', help="visitors [buses [ships [fleets [groups]]]]")
+    batch.add_argument('amounts', nargs='+')
+    infinite = commands.add_parser('add-infinite', help="amounts per level as JSON, e.g. [[2,3],2]")
+    infinite.add_argument('amounts')
+    add = commands.add_parser('add', help="room [visitor number]")
+    add.add_argument('room', nargs='+')
+    for name in ('delete', 'search'):
+        commands.add_parser(name).add_argument('room')
+    commands.add_parser('delete-range', help="lo hi").add_argument('range', nargs=2)
+    commands.add_parser('delete-cohort', help="visitor path prefix, e.g. 0 0 3").add_argument('path', nargs='+')
+    export = commands.add_parser('export', help="filename [json|ndjson] [none|gzip|zstd]")
+    export.add_argument('export', nargs='+')
+    return parser
+
+def _command_line(args) -> str:
+    # a single subcommand is run as a one-line replay
+    values = {'add-batch': 'amounts', 'add-infinite': 'amounts', 'add': 'room', 'delete': 'room',
+              'delete-range': 'range', 'delete-cohort': 'path', 'search': 'room', 'export': 'export'}
+    value = getattr(args, values[args.command])
+    return " ".join([args.command] + (value if isinstance(value, list) else [value]))
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command in (None, 'menu'):
+        cli = HilbertHotelCLI(open_hotel_or_exit(args, verbose=True), args)
+        cli.run()
+        close_hotel(cli.hotel, args.snapshot, primes_path=args.primes)
+        write_profiles(cli.hotel)
+        return
+
+    hotel = open_hotel_or_exit(args, verbose=args.verbose)
+    replayer = replay.Replayer(hotel, keep_results=args.results or args.command != 'replay',
+                               stop_on_error=getattr(args, 'stop_on_error', False))
+    if args.command == 'replay':
+        if args.file == '-':
+            report = replayer.run(sys.stdin)
+        else:
+            with open(args.file) as f:
+                report = replayer.run(f)
+    else:
+        report = replayer.run([_command_line(args)])
+    close_hotel(hotel, args.snapshot, changed=any(name in replay.MUTATIONS for name in replayer.latency),
+                primes_path=args.primes)
+    replay.write_report(replayer, report, args.report)
+    write_profiles(hotel)
+    if replayer.errors:
+        sys.exit(1)
+
 if __name__ == "__main__":
-    cli = HilbertHotelCLI()
-    cli.run()
\ No newline at end of file
+    main()
\ No newline at end of file
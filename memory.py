@@ -0,0 +1,119 @@
+import math
+import random
+import sys
+
+from room import Room
+from room_key import PrimePowerKey
+
+_DIGIT_BITS = sys.int_info.bits_per_digit
+_DIGIT_BYTES = sys.int_info.sizeof_digit
+_INT_HEADER = sys.getsizeof(1) - _DIGIT_BYTES
+_ROOM_BYTES = sys.getsizeof(Room(0))
+
+def int_size(value: int) -> int:
+    # bytes of an int from its bit length, the small ints CPython caches cost nothing per room
+    if -5 <= value <= 256:
+        return 0
+    size = _INT_HEADER + _DIGIT_BYTES * -(-value.bit_length() // _DIGIT_BITS)
+    return (size + 7) & ~7 # allocations are 8-byte aligned
+
+def key_size(room_number) -> int:
+    if isinstance(room_number, int):
+        return int_size(room_number)
+    if isinstance(room_number, PrimePowerKey):
+        return sys.getsizeof(room_number) + sys.getsizeof(room_number.exponents)
+    return sys.getsizeof(room_number)
+
+def payload_size(room: Room) -> int:
+    # path tuple and visitor number, strings are shared literals ("Manual entry", "Empty")
+    path = room.visitor_path
+    size = sys.getsizeof(path) if isinstance(path, (tuple, list)) else 0
+    if isinstance(room.visitor_number, int):
+        size += int_size(room.visitor_number)
+    return size
+
+class MemoryModel:
+    # running estimate of the bytes held by the rooms, kept up to date per operation
+    # so a resource check never walks the hotel
+    def __init__(self):
+        self.rooms = 0
+        self.int_keys = 0 # plain int room numbers, these grow when guests are shifted
+        self.key_bytes = 0.0
+        self.payload_bytes = 0
+
+    def add_room(self, room: Room):
+        self.rooms += 1
+        self.int_keys += isinstance(room.room_number, int)
+        self.key_bytes += key_size(room.room_number)
+        self.payload_bytes += payload_size(room)
+
+    def remove_room(self, room: Room):
+        self.rooms -= 1
+        self.int_keys -= isinstance(room.room_number, int)
+        self.key_bytes = max(0.0, self.key_bytes - key_size(room.room_number))
+        self.payload_bytes = max(0, self.payload_bytes - payload_size(room))
+
+    def add_sorted(self, rooms):
+        # a batch is modelled from its middle and last room, keys grow monotonically
+        # and every room of a batch has the same shape
+        count = len(rooms)
+        if count <= 2:
+            for room in rooms:
+                self.add_room(room)
+            return
+        middle, last = rooms[count // 2], rooms[-1]
+        self.rooms += count
+        if isinstance(middle.room_number, int) and isinstance(last.room_number, int):
+            self.int_keys += count
+        self.key_bytes += count * (key_size(middle.room_number) + key_size(last.room_number)) / 2
+        per_room = (payload_size(middle) + payload_size(last)) / 2
+        if middle.visitor_path is last.visitor_path and isinstance(last.visitor_path, (tuple, list)):
+            # one path tuple shared by the whole batch
+            per_room -= sys.getsizeof(last.visitor_path)
+            self.payload_bytes += sys.getsizeof(last.visitor_path)
+        self.payload_bytes += int(count * per_room)
+
+    def shift(self, n: int, method: int):
+        if not self.int_keys:
+            return
+        if method == 2 and n > 1:
+            grown_bits = math.log2(n)
+        elif method == 1:
+            # an offset only matters once it is wider than the keys themselves
+            average_bits = (self.key_bytes / self.int_keys - _INT_HEADER) / _DIGIT_BYTES * _DIGIT_BITS
+            grown_bits = max(0.0, n.bit_length() - average_bits)
+        else:
+            return
+        self.key_bytes += self.int_keys * _DIGIT_BYTES * grown_bits / _DIGIT_BITS
+
+    def reset(self):
+        self.__init__()
+
+    def estimate(self, hotel) -> int:
+        size = sys.getsizeof(hotel) + sys.getsizeof(hotel.__dict__)
+        size += hotel.rooms.memory_overhead()
+        size += int(self.key_bytes) + self.payload_bytes
+        size += len(hotel._room_cache) * (_ROOM_BYTES + 100) # entry, cached copy
+        for cohort in hotel.cohorts:
+            size += sys.getsizeof(cohort) + sys.getsizeof(cohort.removed) + sys.getsizeof(cohort.cut)
+            size += int_size(cohort.scale) + int_size(cohort.offset)
+        size += len(hotel.primes) * 8
+        return size
+
+def deep_audit(hotel, sample: int = 0) -> int:
+    # exact asizeof walk, or the rooms of a random sample scaled up to the whole hotel
+    try:
+        from pympler import asizeof
+    except ImportError:
+        raise ValueError("The deep memory audit needs the pympler package")
+    rooms = hotel.rooms
+    if not sample or sample >= rooms.size():
+        return asizeof.asizeof(hotel)
+    others = [value for name, value in vars(hotel).items() if name != 'rooms']
+    size = asizeof.asizeof(*others) + rooms.memory_overhead()
+    rng = random.Random(0)
+    picked = [rooms.select(rng.randrange(rooms.size())) for _ in range(sample)]
+    # one call so shared objects (small ints, batch paths) are only counted once
+    payload = asizeof.asizeof(*(part for room in picked
+                                for part in (room.room_number, room.visitor_path, room.visitor_number)))
+    return size + payload * rooms.size() // sample
@@ -0,0 +1,220 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import time
+import tracemalloc
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Optional
+
+SUB_BUCKET_BITS = 3 # 8 buckets per power of two, a bucket is at most 12.5% wide
+_SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+_PROMETHEUS_PREFIX = "hilbert_hotel"
+
+def _bucket_index(value: int) -> int:
+    # log-linear bucket, exact below _SUB_BUCKETS
+    if value < _SUB_BUCKETS:
+        return max(value, 0)
+    shift = value.bit_length() - SUB_BUCKET_BITS - 1
+    return _SUB_BUCKETS * shift + (value >> shift)
+
+def _bucket_bounds(index: int):
+    # [lower, upper) of a bucket
+    if index < _SUB_BUCKETS:
+        return index, index + 1
+    shift = index // _SUB_BUCKETS - 1
+    top = index - _SUB_BUCKETS * shift
+    return top << shift, (top + 1) << shift
+
+class Histogram:
+    # latency histogram in nanoseconds, fixed memory however many samples are observed
+    __slots__ = ['counts', 'count', 'total', 'min', 'max']
+
+    def __init__(self):
+        self.counts = []
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value: int):
+        index = _bucket_index(value)
+        counts = self.counts
+        if index >= len(counts):
+            counts.extend([0] * (index + 1 - len(counts)))
+        counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        # interpolated inside the bucket holding the q-th sample
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower, upper = _bucket_bounds(index)
+                value = lower + (upper - lower) * (rank - seen) / count
+                return min(max(value, self.min), self.max)
+            seen += count
+        return float(self.max)
+
+    def cumulative_buckets(self):
+        # (upper bound, samples <= it) for every non-empty bucket, as Prometheus expects
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count:
+                seen += count
+                yield _bucket_bounds(index)[1], seen
+
+    def summary(self) -> dict:
+        ms = 1e-6
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * ms, 4),
+            'mean_ms': round(self.total / self.count * ms, 4) if self.count else 0.0,
+            'p50_ms': round(self.quantile(0.50) * ms, 4),
+            'p95_ms': round(self.quantile(0.95) * ms, 4),
+            'p99_ms': round(self.quantile(0.99) * ms, 4),
+            'max_ms': round((self.max or 0) * ms, 4),
+        }
+
+def print_sink(event: dict):
+    # the original one-line-per-operation log
+    print(f"[{event['operation']}] {event['duration_ns'] / 1e6:.4f}ms - {event['details']}")
+
+class JsonLinesSink:
+    # one JSON object per operation appended to a file
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', buffering=1 << 16)
+
+    def __call__(self, event: dict):
+        self._file.write(json.dumps(event, default=str) + "\n")
+
+    def close(self):
+        self._file.close()
+
+class MetricsRegistry:
+    # per-operation counters and latency histograms, every recorded event also goes to the sinks
+    def __init__(self, sinks=None):
+        self.sinks = list(sinks) if sinks is not None else [print_sink]
+        self.histograms = defaultdict(Histogram) # operation -> latency
+        self.counters = defaultdict(lambda: defaultdict(int)) # counter -> operation -> value
+        self.profiles = {} # operation -> last capture
+        self._capture = {} # operation -> (cprofile, tracemalloc) flags
+        self._profiling = False # a capture runs cProfile, nested captures share its profile
+
+    def record(self, operation: str, duration_ns: int, details: str = "", silent: bool = False, rooms: int = 0):
+        # silent still counts the operation, it only skips the sinks
+        self.histograms[operation].observe(duration_ns)
+        self.counters['operations'][operation] += 1
+        if rooms:
+            self.counters['rooms_touched'][operation] += rooms
+        if silent or not self.sinks:
+            return
+        event = {'timestamp': time.time(), 'operation': operation, 'duration_ns': duration_ns,
+                 'details': details, 'rooms': rooms}
+        for sink in self.sinks:
+            sink(event)
+
+    def increment(self, counter: str, operation: str, amount: int = 1):
+        self.counters[counter][operation] += amount
+
+    def enable_capture(self, operation: str, profile: bool = True, memory: bool = False):
+        # operations wrapped in capture() are run under cProfile and/or tracemalloc
+        self._capture[operation] = (profile, memory)
+
+    def disable_capture(self, operation: str):
+        self._capture.pop(operation, None)
+
+    def capturing(self, operation: str) -> bool:
+        return operation in self._capture
+
+    @contextmanager
+    def capture(self, operation: str):
+        # with hotel.metrics.capture("ADD_BATCH"): hotel.add_batch_visitors(...)
+        profile, memory = self._capture.get(operation, (False, False))
+        if not profile and not memory:
+            yield
+            return
+        # one profiler at a time, a capture inside another one (a checkpoint in a batch) is in its profile
+        profiler = cProfile.Profile() if profile and not self._profiling else None
+        started_tracing = memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if memory and hasattr(tracemalloc, 'reset_peak'): # 3.9+
+            tracemalloc.reset_peak()
+        if profiler:
+            self._profiling = True
+            profiler.enable()
+        try:
+            yield
+        finally:
+            result = {}
+            if profiler:
+                profiler.disable()
+                self._profiling = False
+                stream = io.StringIO()
+                pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(20)
+                result['profile'] = stream.getvalue()
+            if memory:
+                current, peak = tracemalloc.get_traced_memory()
+                result['memory_current_bytes'] = current
+                result['memory_peak_bytes'] = peak
+                if started_tracing:
+                    tracemalloc.stop()
+            self.profiles[operation] = result
+
+    def reset(self):
+        self.histograms.clear()
+        self.counters.clear()
+        self.profiles.clear()
+
+    def as_dict(self) -> dict:
+        return {
+            'operations': {operation: histogram.summary() for operation, histogram in sorted(self.histograms.items())},
+            'counters': {counter: dict(values) for counter, values in self.counters.items()},
+        }
+
+    def to_prometheus(self) -> str:
+        lines = [f"# TYPE {_PROMETHEUS_PREFIX}_operation_seconds histogram"]
+        for operation, histogram in sorted(self.histograms.items()):
+            label = f'operation="{operation}"'
+            for upper, seen in histogram.cumulative_buckets():
+                lines.append(f'{_PROMETHEUS_PREFIX}_operation_seconds_bucket{{{label},le="{upper / 1e9:.9g}"}} {seen}')
+            lines.append(f'{_PROMETHEUS_PREFIX}_operation_seconds_bucket{{{label},le="+Inf"}} {histogram.count}')
+            lines.append(f'{_PROMETHEUS_PREFIX}_operation_seconds_sum{{{label}}} {histogram.total / 1e9:.9g}')
+            lines.append(f'{_PROMETHEUS_PREFIX}_operation_seconds_count{{{label}}} {histogram.count}')
+        for counter, values in sorted(self.counters.items()):
+            name = f"{_PROMETHEUS_PREFIX}_{counter}_total"
+            lines.append(f"# TYPE {name} counter")
+            for operation, value in sorted(values.items()):
+                lines.append(f'{name}{{operation="{operation}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        # textfile collector format, replaced atomically so a scrape never sees half a file
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.to_prometheus())
+        os.replace(tmp_path, path)
+
+    def write_json_lines(self, path: Optional[str] = None, f=None):
+        # one line per operation summary and per counter
+        timestamp = time.time()
+        lines = [json.dumps({'timestamp': timestamp, 'operation': operation, **histogram.summary()})
+                 for operation, histogram in sorted(self.histograms.items())]
+        lines += [json.dumps({'timestamp': timestamp, 'counter': counter, 'values': dict(values)})
+                  for counter, values in sorted(self.counters.items())]
+        text = "\n".join(lines) + "\n"
+        if f is not None:
+            f.write(text)
+        else:
+            with open(path, 'a') as out:
+                out.write(text)
@@ -0,0 +1,294 @@
+import math
+import threading
+from collections import Counter
+from typing import Optional, List
+
+from room import Room
+from AVL import AVLNode, AVLTree
+
+# copy-on-write AVLTree: snapshot() hands out a frozen version that other threads can read
+# without locks while the tree keeps changing
+#   with hotel.rooms.snapshot() as rooms:
+#       for room in rooms.iter_inorder(): ...
+# snapshot() opens a new epoch (an identity transform), nodes from before the newest live
+# snapshot's epoch are shared and never written to again: a write copies the nodes on its path
+# (path copying) and the old ones stay with the snapshots that still reach them. nodes have no
+# parent pointers, so a version is freed by reference counting as soon as no snapshot holds it
+
+class PersistentAVLTree(AVLTree):
+    supports_snapshots = True
+
+    def __init__(self):
+        super().__init__()
+        self._frozen = 0 # nodes from an earlier epoch are shared with a snapshot
+        self._readers = Counter() # snapshot epoch -> live snapshots taken at it
+        self._lock = threading.RLock() # one writer at a time, snapshots are taken between writes
+
+    def _key(self, node):
+        # shared nodes are never caught up in place, their current room number is computed
+        if node.epoch == self._epoch:
+            return node.key
+        a, b = self._transform(node.epoch)
+        key = a * node.key + b
+        if node.epoch >= self._frozen:
+            if key != node.key:
+                room = node.room
+                node.room = Room(key, room.visitor_path, room.visitor_number, "old") # for visualize
+            node.key = key
+            node.epoch = self._epoch
+        return key
+
+    def _room(self, node) -> Room:
+        # readers get their own copy, the stored Room may be shared between versions
+        key = self._key(node)
+        room = node.room
+        return Room(key, room.visitor_path, room.visitor_number, room.guest_status if key == node.key else "old")
+
+    def _fresh(self, node):
+        # the node itself when this version owns it, otherwise a copy caught up to the current epoch
+        if node is None or node.epoch >= self._frozen:
+            return node
+        key = self._key(node)
+        room = node.room
+        if key != node.key:
+            room = Room(key, room.visitor_path, room.visitor_number, "old")
+        copy = AVLNode(room, self._epoch)
+        copy.key = key
+        copy.left, copy.right = node.left, node.right
+        copy.height, copy.size = node.height, node.size
+        return copy
+
+    def _fresh_path(self, path, room_number):
+        # owned versions of the nodes on a search path, each linked under the owned version of its parent
+        fresh = []
+        for node in path:
+            copy = self._fresh(node)
+            if copy is not node:
+                if not fresh:
+                    self.root = copy
+                elif room_number < fresh[-1].key:
+                    fresh[-1].left = copy
+                else:
+                    fresh[-1].right = copy
+            fresh.append(copy)
+        return fresh
+
+    def _right_rotate(self, y):
+        y = self._fresh(y)
+        y.left = self._fresh(y.left)
+        return super()._right_rotate(y)
+
+    def _left_rotate(self, x):
+        x = self._fresh(x)
+        x.right = self._fresh(x.right)
+        return super()._left_rotate(x)
+
+    def balance(self, node):
+        return super().balance(self._fresh(node))
+
+    def _split(self, node, room_number):
+        return super()._split(self._fresh(node), room_number)
+
+    def _join(self, left, node, right):
+        # only the node whose children change is copied
+        left_height, right_height = self._get_height(left), self._get_height(right)
+        if left_height > right_height + 1:
+            left = self._fresh(left)
+        elif right_height > left_height + 1:
+            right = self._fresh(right)
+        else:
+            node = self._fresh(node)
+        return super()._join(left, node, right)
+
+    def insert(self, room: Room):
+        with self._lock:
+            room_number = room.room_number
+            path = []
+            node = self.root
+            while node:
+                key = self._key(node)
+                if room_number == key:
+                    return # occupied
+                path.append(node)
+                node = node.left if room_number < key else node.right
+            self._cached_size += 1
+            # the tree keeps its own Room, the caller may still change the one it passed in
+            room = Room(room_number, room.visitor_path, room.visitor_number, room.guest_status)
+            self._retrace(self._fresh_path(path, room_number), AVLNode(room, self._epoch), room_number, 1)
+
+    def delete(self, room_number: int):
+        with self._lock:
+            path = []
+            node = self.root
+            while node:
+                key = self._key(node)
+                if room_number == key:
+                    break
+                path.append(node)
+                node = node.left if room_number < key else node.right
+            if not node:
+                return
+            if node.left and node.right:
+                # the successor's room moves into this node, then the successor is unlinked
+                path.append(node)
+                target = len(path) - 1
+                successor = node.right
+                successor_key = self._key(successor) # retracing compares with the stored keys
+                while successor.left:
+                    path.append(successor)
+                    successor = successor.left
+                    successor_key = self._key(successor)
+                path = self._fresh_path(path, room_number)
+                room = successor.room
+                if successor_key != successor.key:
+                    room = Room(successor_key, room.visitor_path, room.visitor_number, "old")
+                path[target].room, path[target].key, path[target].epoch = room, successor_key, self._epoch
+                room_number = successor_key
+                node = successor
+            else:
+                path = self._fresh_path(path, room_number)
+            self._cached_size -= 1
+            self._retrace(path, node.left or node.right, room_number, -1)
+
+    def delete_range(self, lo, hi) -> List[Room]:
+        # the splits copy the shared nodes on the two cut paths, the cut-out part is only read
+        with self._lock:
+            return super().delete_range(lo, hi)
+
+    def _subtree_rooms(self, node) -> List[Room]:
+        rooms = []
+        stack = []
+        while stack or node:
+            while node:
+                stack.append(node)
+                node = node.left
+            node = stack.pop()
+            rooms.append(self._room(node))
+            node = node.right
+        return rooms
+
+    def build_from_sorted(self, sorted_rooms: List[Room]):
+        with self._lock:
+            super().build_from_sorted(sorted_rooms)
+
+    def merge_sorted(self, sorted_rooms: List[Room]) -> List[Room]:
+        with self._lock:
+            return super().merge_sorted(sorted_rooms)
+
+    def shift(self, n, method):
+        with self._lock:
+            super().shift(n, method)
+
+    def search(self, room_number: int) -> Optional[Room]:
+        node = self.root
+        while node:
+            key = self._key(node)
+            if room_number == key:
+                return self._room(node)
+            node = node.left if room_number < key else node.right
+        return None
+
+    def search_sorted(self, sorted_room_numbers) -> List[Optional[Room]]:
+        return [self._room(node) if node else None for node in self._find_sorted(sorted_room_numbers)]
+
+    def select(self, index: int) -> Optional[Room]:
+        if index < 0 or index >= self._get_size(self.root):
+            return None
+        node = self.root
+        while node:
+            left_size = self._get_size(node.left)
+            if index < left_size:
+                node = node.left
+            elif index == left_size:
+                return self._room(node)
+            else:
+                index -= left_size + 1
+                node = node.right
+        return None
+
+    def iter_from(self, room_number=None):
+        stack = []
+        current = self.root
+        while current:
+            if room_number is None or self._key(current) >= room_number:
+                stack.append(current)
+                current = current.left
+            else:
+                current = current.right
+        while stack:
+            current = stack.pop()
+            yield self._room(current)
+            current = current.right
+            while current:
+                stack.append(current)
+                current = current.left
+
+    def inorder_traversal(self) -> List[Room]:
+        return list(self.iter_from())
+
+    def print_inorder(self):
+        if not self.root:
+            print("Tree is empty")
+            return
+        count = 0
+        for room in self.iter_from():
+            print(room)
+            count += 1
+        return count
+
+    def snapshot(self) -> 'AVLSnapshot':
+        with self._lock:
+            self._epoch += 1
+            self._transforms.append((self._scale, self._offset))
+            self._frozen = self._epoch
+            self._readers[self._epoch] += 1
+            return AVLSnapshot(self)
+
+    def _release(self, epoch: int):
+        # nodes only the released snapshot was keeping shared can be edited in place again
+        with self._lock:
+            self._readers[epoch] -= 1
+            if not self._readers[epoch]:
+                del self._readers[epoch]
+            self._frozen = max(self._readers, default=0)
+
+    def active_snapshots(self) -> int:
+        return sum(self._readers.values())
+
+class AVLSnapshot(PersistentAVLTree):
+    # one frozen version of a PersistentAVLTree, released explicitly, on `with` exit or when collected
+    def __init__(self, tree: PersistentAVLTree):
+        # no super().__init__(): the state is the tree's as of now, not a new tree
+        self.root = tree.root
+        self._cached_size = tree._cached_size
+        self._scale, self._offset, self._epoch = tree._scale, tree._offset, tree._epoch
+        self._transforms = tree._transforms # append-only, entries past our epoch are never read
+        self._frozen = math.inf # every node is shared, nothing is written back
+        self._tree = tree
+
+    def release(self):
+        tree, self._tree = self._tree, None
+        if tree is not None:
+            self.root = None
+            self._cached_size = 0
+            tree._release(self._epoch)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def __del__(self):
+        self.release()
+
+    def _read_only(self, *args, **kwargs):
+        raise ValueError("A snapshot is read-only")
+
+    insert = delete = delete_range = build_from_sorted = bulk_load = merge_sorted = shift = change_room = _read_only
+
+    def snapshot(self) -> 'AVLSnapshot':
+        raise ValueError("Take snapshots from the tree, not from a snapshot")
+
+    def active_snapshots(self) -> int:
+        return 0
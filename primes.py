@@ -0,0 +1,127 @@
+import math
+import mmap
+import os
+import struct
+from array import array
+from bisect import bisect_right
+from itertools import compress
+
+SEGMENT_SIZE = 1 << 18 # numbers sieved per segment
+_HEADER = struct.Struct('<8sQQ') # magic, sieved limit, prime count
+_MAGIC = b'HHPRIME1'
+
+class PrimeTable:
+    # every prime up to `limit`, grown with a segmented Sieve of Eratosthenes
+    _shared = None
+
+    def __init__(self):
+        self.primes = array('Q')
+        self.limit = 1 # every number <= limit has been sieved
+        self._mmap = None
+
+    @classmethod
+    def shared(cls) -> 'PrimeTable':
+        # one table per process, new hotels do not sieve again
+        if cls._shared is None:
+            cls._shared = cls()
+        return cls._shared
+
+    @classmethod
+    def adopt(cls, table: 'PrimeTable'):
+        # a table loaded from disk becomes the shared one if it knows more primes
+        if cls._shared is None or len(table) > len(cls._shared):
+            cls._shared = table
+
+    @classmethod
+    def from_buffer(cls, buffer, limit: int, mapped=None) -> 'PrimeTable':
+        # read-only table over packed uint64 primes, `mapped` is kept open while it is in use
+        table = cls()
+        table.primes = memoryview(buffer).cast('B').cast('Q')
+        table.limit = limit
+        table._mmap = mapped
+        return table
+
+    def __len__(self):
+        return len(self.primes)
+
+    def nth_prime(self, index: int) -> int:
+        # 0-based, nth_prime(0) == 2
+        if index < 0:
+            raise ValueError("Index must be non-negative")
+        if index >= len(self.primes):
+            self._sieve_to(self._nth_prime_bound(index + 1))
+        return self.primes[index]
+
+    def primes_up_to(self, limit: int):
+        self._sieve_to(limit)
+        return self.primes[:bisect_right(self.primes, limit)]
+
+    @staticmethod
+    def _nth_prime_bound(n: int) -> int:
+        # p_n < n (ln n + ln ln n) for n >= 6 (Rosser), the inverse of the prime-counting bound
+        if n < 6:
+            return 13
+        log_n = math.log(n)
+        return int(n * (log_n + math.log(log_n))) + 1
+
+    def _sieve_to(self, limit: int):
+        if limit <= self.limit:
+            return
+        root = math.isqrt(limit)
+        if root > self.limit:
+            self._sieve_to(root) # base primes first
+        self._make_writable()
+
+        low = self.limit + 1
+        while low <= limit:
+            high = min(low + SEGMENT_SIZE - 1, limit)
+            segment = bytearray(b'\x01') * (high - low + 1)
+            for prime in self.primes:
+                if prime * prime > high:
+                    break
+                start = max(prime * prime, -(-low // prime) * prime) - low
+                segment[start::prime] = bytes(len(range(start, len(segment), prime)))
+            self.primes.extend(compress(range(low, high + 1), segment))
+            self.limit = high
+            low = high + 1
+
+    def _make_writable(self):
+        # a loaded table is a read-only view of the file until it has to grow
+        if self._mmap is not None:
+            self.primes = array('Q', self.primes)
+            self._mmap = None # unmapped once no view of it is left
+
+    def save(self, path: str):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(_MAGIC, self.limit, len(self.primes)))
+            f.write(self.primes.tobytes())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> 'PrimeTable':
+        # memory-maps the file, the primes are used in place without parsing
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, limit, count = _HEADER.unpack_from(mapped, 0)
+        if magic != _MAGIC or len(mapped) != _HEADER.size + count * 8:
+            mapped.close()
+            raise ValueError(f"{path} is not a prime table")
+        return cls.from_buffer(memoryview(mapped)[_HEADER.size:], limit, mapped)
+
+    @classmethod
+    def open(cls, path: str) -> 'PrimeTable':
+        # the shared table, taken from the file at path when there is one
+        if os.path.exists(path):
+            cls.adopt(cls.load(path))
+        return cls.shared()
+
+    @staticmethod
+    def saved_limit(path: str) -> int:
+        # sieved limit of the table saved at path, 0 when there is none
+        try:
+            with open(path, 'rb') as f:
+                magic, limit, _ = _HEADER.unpack(f.read(_HEADER.size))
+        except (OSError, struct.error):
+            return 0
+        return limit if magic == _MAGIC else 0
@@ -0,0 +1,171 @@
+import json
+import sys
+import time
+from collections import defaultdict
+
+from metrics import Histogram
+
+# scripted hotel operations, one command per line, blank lines and # comments are skipped:
+#   add-batch VISITORS [BUSES [SHIPS [FLEETS [GROUPS]]]]
+#   add-infinite AMOUNT_PER_LEVEL          JSON list, e.g. [[2,3],2]
+#   add ROOM [VISITOR_NUMBER]
+#   delete ROOM
+#   delete-range LO HI
+#   delete-cohort LEVEL [LEVEL ...]        visitor path prefix, e.g. 0 0 3 = ship 3 of a ships batch
+#   search ROOM
+#   export FILENAME [json|ndjson] [none|gzip|zstd]
+
+COMMANDS = ('add-batch', 'add-infinite', 'add', 'delete', 'delete-range', 'delete-cohort', 'search', 'export')
+MUTATIONS = ('add-batch', 'add-infinite', 'add', 'delete', 'delete-range', 'delete-cohort')
+_ARITY = { # (min, max) arguments
+    'add-batch': (1, 5),
+    'add-infinite': (1, None),
+    'add': (1, 2),
+    'delete': (1, 1),
+    'delete-range': (2, 2),
+    'delete-cohort': (1, None),
+    'search': (1, 1),
+    'export': (1, 3),
+}
+
+def batch_total(visitors: int, buses: int = 0, ships: int = 0, fleets: int = 0, groups: int = 0) -> int:
+    # guests of a batch, levels left at 0 are not part of it
+    total = visitors
+    for amount in (buses, ships, fleets, groups):
+        if amount > 0:
+            total *= amount
+    return total
+
+def _int(value: str) -> int:
+    number = int(value)
+    if number < 0:
+        raise ValueError(f"Expected a non-negative number, got {value}")
+    return number
+
+def parse_command(line: str):
+    # (command, arguments) or None for a blank line / comment
+    line = line.split('#', 1)[0].strip()
+    if not line:
+        return None
+    name, *args = line.split()
+    name = name.lower()
+    if name not in _ARITY:
+        raise ValueError(f"Unknown command {name}")
+    low, high = _ARITY[name]
+    if len(args) < low or (high is not None and len(args) > high):
+        raise ValueError(f"Wrong number of arguments for {name}")
+    if name == 'add-infinite':
+        amount_per_level = json.loads("".join(args))
+        if not isinstance(amount_per_level, list) or not amount_per_level:
+            raise ValueError("add-infinite expects a JSON list of amounts per level")
+        return name, (amount_per_level,)
+    if name == 'export':
+        return name, tuple(args)
+    args = tuple(map(_int, args))
+    if name == 'add' and args[0] < 1:
+        raise ValueError(f"Room numbers start at 1, got {args[0]}")
+    return name, args
+
+class Replayer:
+    # runs commands back to back against one hotel, timing each one
+    def __init__(self, hotel, keep_results: bool = False, stop_on_error: bool = False):
+        self.hotel = hotel
+        self.keep_results = keep_results # search results etc. are collected, printed once at the end
+        self.stop_on_error = stop_on_error
+        self.latency = defaultdict(Histogram) # command -> latency
+        self.results = []
+        self.errors = [] # (line number, message)
+        self.commands = 0
+        self.elapsed_ns = 0
+
+    def execute(self, name: str, args: tuple) -> str:
+        hotel = self.hotel
+        if name == 'add-batch':
+            added = hotel.add_batch_visitors(batch_total(*args), *args)
+            return f"add-batch {' '.join(map(str, args))}: {added} guests"
+        if name == 'add-infinite':
+            amount_per_level = args[0]
+            added = hotel.add_infinite(len(amount_per_level), amount_per_level)
+            return f"add-infinite {json.dumps(amount_per_level)}: {added} guests"
+        if name == 'add':
+            room_number = args[0]
+            visitor_number = args[1] if len(args) > 1 else 1
+            if hotel.contains(room_number):
+                return f"add {room_number}: occupied"
+            hotel.add_manual(room_number, "Manual entry", visitor_number)
+            return f"add {room_number}: added"
+        if name == 'delete':
+            return f"delete {args[0]}: {'deleted' if hotel.delete_manual(args[0]) else 'not found'}"
+        if name == 'delete-range':
+            return f"delete-range {args[0]} {args[1]}: {hotel.delete_range(*args)} deleted"
+        if name == 'delete-cohort':
+            return f"delete-cohort {' '.join(map(str, args))}: {hotel.delete_cohort(args)} deleted"
+        if name == 'search':
+            room = hotel.search_room(args[0])
+            return f"search {args[0]}: {room if room else 'not found'}"
+        if name == 'export':
+            filename, format_type, compression = (args + ('json', 'none'))[:3]
+            path = hotel.export_data(filename, format_type, None if compression == 'none' else compression)
+            if not path:
+                raise ValueError(f"Export to {filename} failed")
+            return f"export: {path}"
+        raise ValueError(f"Unknown command {name}")
+
+    def run_command(self, name: str, args: tuple):
+        start_time = time.perf_counter_ns()
+        result = self.execute(name, args)
+        duration = time.perf_counter_ns() - start_time
+        self.latency[name].observe(duration)
+        self.commands += 1
+        self.elapsed_ns += duration
+        if self.keep_results:
+            self.results.append(result)
+        return result
+
+    def run(self, lines) -> dict:
+        for line_number, line in enumerate(lines, 1):
+            try:
+                command = parse_command(line)
+                if command is not None:
+                    self.run_command(*command)
+            except (ValueError, TypeError) as e: # TypeError: bad JSON amounts for add-infinite
+                self.errors.append((line_number, str(e)))
+                if self.stop_on_error:
+                    break
+        return self.report()
+
+    def report(self) -> dict:
+        seconds = self.elapsed_ns / 1e9
+        return {
+            'commands': self.commands,
+            'errors': len(self.errors),
+            'seconds': round(seconds, 6),
+            'commands_per_second': round(self.commands / seconds, 1) if seconds else 0.0,
+            'total_guests': self.hotel.total_guests,
+            'total_rooms': self.hotel.total_rooms(),
+            'latency': {name: histogram.summary() for name, histogram in sorted(self.latency.items())},
+        }
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"Commands: {report['commands']} in {report['seconds']:.4f}s "
+        f"({report['commands_per_second']} commands/s), errors: {report['errors']}",
+        f"Hotel: {report['total_guests']} guests in {report['total_rooms']} rooms",
+        "Latency (ms):",
+    ]
+    for name, stats in report['latency'].items():
+        lines.append(f"  {name:<13} n={stats['count']:<8} mean={stats['mean_ms']:<10} p50={stats['p50_ms']:<10} "
+                     f"p95={stats['p95_ms']:<10} p99={stats['p99_ms']:<10} max={stats['max_ms']}")
+    return "\n".join(lines)
+
+def write_report(replayer: Replayer, report: dict, report_format: str = 'text', out=None):
+    # buffered results first, then the summary
+    out = out or sys.stdout
+    if replayer.results:
+        out.write("\n".join(replayer.results) + "\n")
+    for line_number, message in replayer.errors:
+        print(f"line {line_number}: {message}", file=sys.stderr)
+    if report_format == 'json':
+        out.write(json.dumps(report, indent=2) + "\n")
+    else:
+        out.write(format_report(report) + "\n")
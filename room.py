@@ -24,8 +24,11 @@ class Room:
     
     # for export as JSON
     def to_dict(self):
+        room_number = self.room_number
+        if not isinstance(room_number, int):
+            room_number = room_number.to_json() # exponent-vector key of an infinite hierarchy
         return {
-            'room_number': self.room_number,
+            'room_number': room_number,
             'visitor_path': self.visitor_path,
             'visitor_number': self.visitor_number,
             'guest_status': getattr(self, 'guest_status', 'new')
@@ -0,0 +1,184 @@
+import math
+import sys
+from bisect import bisect_left
+
+from primes import PrimeTable
+
+_HASH_MODULUS = sys.hash_info.modulus # hash(n) == n % modulus for n > 0
+_MAX_DECIMAL_DIGITS = 4000 # str(int) refuses ~4300 digits by default
+_MAX_TRIAL_PRIMES = 10000 # factors with a larger prime fall back to a plain int
+
+def _prime(index: int) -> int:
+    return PrimeTable.shared().nth_prime(index)
+
+class PrimePowerKey:
+    # room number prod(prime(i) ** exponents[i]) kept as its exponent vector,
+    # ordered by log magnitude with an exact tie-break, an int only when asked for
+    __slots__ = ['exponents', 'log2', '_hash']
+
+    def __init__(self, exponents):
+        exponents = tuple(exponents)
+        while exponents and not exponents[-1]:
+            exponents = exponents[:-1]
+        self.exponents = exponents
+        log2 = 0.0
+        value_hash = 1
+        for i, power in enumerate(exponents):
+            if power:
+                prime = _prime(i)
+                log2 += power * math.log2(prime)
+                value_hash = value_hash * pow(prime, power, _HASH_MODULUS) % _HASH_MODULUS
+        self.log2 = log2
+        self._hash = value_hash
+
+    @classmethod
+    def from_parts(cls, exponents, log2: float, value_hash: int) -> 'PrimePowerKey':
+        # a key whose log and hash were already computed, e.g. by a worker process
+        key = cls.__new__(cls)
+        exponents = tuple(exponents)
+        while exponents and not exponents[-1]:
+            exponents = exponents[:-1]
+        key.exponents = exponents
+        key.log2 = log2
+        key._hash = value_hash
+        return key
+
+    def __int__(self):
+        value = 1
+        for i, power in enumerate(self.exponents):
+            if power:
+                value *= _prime(i) ** power
+        return value
+
+    __index__ = __int__
+
+    def __hash__(self):
+        return self._hash
+
+    def bit_length(self) -> int:
+        return int(self.log2) + 1
+
+    def _compare(self, other) -> int:
+        if isinstance(other, PrimePowerKey):
+            if self.exponents == other.exponents:
+                return 0
+            other_log2 = other.log2
+        elif isinstance(other, int):
+            if other <= 0:
+                return 1
+            other_log2 = math.log2(other)
+        else:
+            return NotImplemented
+        difference = self.log2 - other_log2
+        if abs(difference) > 1e-9 * max(1.0, self.log2):
+            return 1 if difference > 0 else -1
+        return self._compare_exact(other)
+
+    def _compare_exact(self, other) -> int:
+        # logs too close to call, compare the parts that are not common to both sides
+        if isinstance(other, PrimePowerKey):
+            mine, theirs = 1, 1
+            length = max(len(self.exponents), len(other.exponents))
+            left = self.exponents + (0,) * (length - len(self.exponents))
+            right = other.exponents + (0,) * (length - len(other.exponents))
+            for i, (a, b) in enumerate(zip(left, right)):
+                if a > b:
+                    mine *= _prime(i) ** (a - b)
+                elif b > a:
+                    theirs *= _prime(i) ** (b - a)
+        else:
+            mine, theirs = int(self), other
+        return (mine > theirs) - (mine < theirs)
+
+    def __eq__(self, other):
+        if isinstance(other, (int, PrimePowerKey)) and hash(other) != self._hash:
+            return False
+        result = self._compare(other)
+        return result if result is NotImplemented else result == 0
+
+    def __lt__(self, other):
+        result = self._compare(other)
+        return result if result is NotImplemented else result < 0
+
+    def __le__(self, other):
+        result = self._compare(other)
+        return result if result is NotImplemented else result <= 0
+
+    def __gt__(self, other):
+        result = self._compare(other)
+        return result if result is NotImplemented else result > 0
+
+    def __ge__(self, other):
+        result = self._compare(other)
+        return result if result is NotImplemented else result >= 0
+
+    def __mul__(self, other):
+        # shifting multiplies, stays a key while the factor splits over the prime table
+        if not isinstance(other, int):
+            return NotImplemented
+        if other == 1:
+            return self
+        exponents = list(self.exponents)
+        remaining = other
+        table = PrimeTable.shared()
+        index = 0
+        while remaining > 1:
+            if index >= _MAX_TRIAL_PRIMES:
+                return int(self) * other
+            prime = table.nth_prime(index)
+            if prime * prime > remaining:
+                # what is left is prime, use it if the table already holds it
+                index = bisect_left(table.primes, remaining)
+                if index == len(table.primes) or table.primes[index] != remaining:
+                    return int(self) * other
+                prime = remaining
+            while remaining % prime == 0:
+                remaining //= prime
+                if index >= len(exponents):
+                    exponents.extend([0] * (index + 1 - len(exponents)))
+                exponents[index] += 1
+            index += 1
+        return PrimePowerKey(exponents) if remaining == 1 and other > 0 else int(self) * other
+
+    __rmul__ = __mul__
+
+    def __add__(self, other):
+        if other == 0:
+            return self
+        return int(self) + other
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        if other == 0:
+            return self
+        return int(self) - other
+
+    def __rsub__(self, other):
+        return other - int(self)
+
+    def __mod__(self, other):
+        if not isinstance(other, int):
+            return NotImplemented
+        result = 1 % other
+        for i, power in enumerate(self.exponents):
+            if power:
+                result = result * pow(_prime(i), power, other) % other
+        return result
+
+    def __floordiv__(self, other):
+        return int(self) // other
+
+    def to_json(self):
+        # an int while it still prints, the factorisation beyond that
+        if self.log2 * 0.30103 < _MAX_DECIMAL_DIGITS:
+            return int(self)
+        return str(self)
+
+    def __str__(self):
+        if self.log2 * 0.30103 < _MAX_DECIMAL_DIGITS:
+            return str(int(self))
+        return " * ".join(f"{_prime(i)}^{power}" for i, power in enumerate(self.exponents) if power)
+
+    def __repr__(self):
+        return f"PrimePowerKey({self.exponents})"
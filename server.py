@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+import json
+
+from HilbertHotel import HilbertHotel
+from main import add_hotel_arguments, close_hotel, open_hotel_or_exit
+from replay import Replayer, parse_command
+
+# asyncio TCP front-end, one command per line (the replay.py format plus metrics / stats / quit),
+# one JSON object per response line: {"ok": true, "result": ...} or {"ok": false, "error": ...}
+#   python server.py --port 8650 --storage block --snapshot hotel.snap --journal hotel.log
+#   printf 'add-batch 100 10\nsearch 12\nmetrics\n' | nc 127.0.0.1 8650
+# the hotel is only touched from the event loop thread: searches are coalesced into sorted
+# batches, mutations go through one writer task, so no locks are needed
+
+DEFAULT_PORT = 8650
+MAX_BATCH = 4096 # searches answered per batch, a full batch is flushed at once
+_ADMIN = ('metrics', 'stats', 'quit')
+
+class HotelServer:
+    def __init__(self, hotel: HilbertHotel, batch_window: float = 0.0, max_batch: int = MAX_BATCH):
+        self.hotel = hotel
+        self.batch_window = batch_window # seconds a search waits for others, 0 = until the loop is idle
+        self.max_batch = max_batch
+        self.replayer = Replayer(hotel) # runs and times the mutations
+        self.clients = 0
+        self._pending = [] # (room number, future) waiting for the next batch
+        self._flush_handle = None
+        self._writes = None # (command, arguments, future), created on the running loop
+        self._writer_task = None
+        self._server = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT):
+        self._writes = asyncio.Queue()
+        self._writer_task = asyncio.ensure_future(self._writer())
+        self._server = await asyncio.start_server(self._handle_client, host, port)
+        return self._server
+
+    async def close(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._writer_task.cancel()
+        self._flush()
+
+    def search(self, room_number: int) -> asyncio.Future:
+        # resolves to the room as a dict (None when empty) as of the batch it was answered in
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((room_number, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            if self.batch_window:
+                self._flush_handle = loop.call_later(self.batch_window, self._flush)
+            else:
+                self._flush_handle = loop.call_soon(self._flush)
+        return future
+
+    def _flush(self):
+        # the whole batch is one search_many: the distinct rooms asked for in one finger-search pass
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        rooms, _, _ = self.hotel.search_many(room_number for room_number, _ in pending)
+        for (_, future), room in zip(pending, rooms):
+            if not future.done():
+                # serialized now, the Room is live and a mutation may run before the client resumes
+                future.set_result(room.to_dict() if room else None)
+
+    async def write(self, name: str, args: tuple):
+        future = asyncio.get_running_loop().create_future()
+        await self._writes.put((name, args, future))
+        return await future
+
+    async def _writer(self):
+        # the only task that changes the hotel, queued mutations run back to back
+        while True:
+            batch = [await self._writes.get()]
+            while not self._writes.empty():
+                batch.append(self._writes.get_nowait())
+            self._flush() # searches that came first see the hotel as it was
+            for name, args, future in batch:
+                try:
+                    result = self.replayer.run_command(name, args)
+                except Exception as e: # reported to the client, the writer keeps going
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+                if not future.done():
+                    future.set_result(result)
+
+    async def _dispatch(self, line: str):
+        name = line.split('#', 1)[0].strip().split(' ', 1)[0].lower()
+        if name in _ADMIN:
+            self.hotel.metrics.increment('server_requests', name)
+            if name == 'metrics':
+                return {'ok': True, 'result': self.hotel.metrics.to_prometheus()}
+            if name == 'stats':
+                usage = self.hotel.get_resource_usage()
+                usage['clients'] = self.clients
+                usage['commands'] = self.replayer.report()['latency']
+                usage['profiles'] = self.hotel.metrics.profiles # --profile captures
+                return {'ok': True, 'result': usage}
+            return {'ok': True, 'result': 'bye'}
+        command = parse_command(line)
+        if command is None:
+            return None
+        name, args = command
+        self.hotel.metrics.increment('server_requests', name)
+        if name == 'search':
+            return {'ok': True, 'result': await self.search(args[0])}
+        return {'ok': True, 'result': await self.write(name, args)}
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # requests of one connection are answered in order, one at a time
+        self.clients += 1
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode(errors='replace')
+                try:
+                    response = await self._dispatch(line)
+                except Exception as e:
+                    response = {'ok': False, 'error': str(e)}
+                if response is None:
+                    continue
+                writer.write((json.dumps(response, default=str) + "\n").encode())
+                await writer.drain()
+                if response.get('result') == 'bye':
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+async def serve(hotel: HilbertHotel, host: str, port: int, batch_window: float = 0.0,
+                max_batch: int = MAX_BATCH):
+    server = HotelServer(hotel, batch_window, max_batch)
+    listener = await server.start(host, port)
+    addresses = ", ".join(str(sock.getsockname()) for sock in listener.sockets)
+    print(f"Serving the hotel on {addresses}")
+    try:
+        await listener.serve_forever()
+    finally:
+        await server.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a Hilbert Hotel over a TCP line protocol.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    add_hotel_arguments(parser)
+    parser.add_argument('--batch-window', type=float, default=0.0,
+                        help="milliseconds a search waits to be batched with others")
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH)
+    args = parser.parse_args(argv)
+
+    hotel = open_hotel_or_exit(args, verbose=args.verbose)
+    try:
+        asyncio.run(serve(hotel, args.host, args.port, args.batch_window / 1000, max(1, args.max_batch)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if close_hotel(hotel, args.snapshot, primes_path=args.primes) and args.snapshot and hotel.journal is None:
+            print(f"Snapshot saved to {args.snapshot}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from room import Room
+from cohort import Cohort
+from primes import PrimeTable
+from room_key import PrimePowerKey
+from storage import paused_gc
+from journal import fsync_directory
+
+# file layout: magic, then sections of (tag, 4 pad bytes, payload length, payload), the header is
+# 16 bytes and every payload is padded to 8, so each column starts 8-byte aligned in the mapping
+# META  json: totals, column encodings, cohorts
+# KEYS  room numbers, int64 column or tagged records for big ints / exponent vectors
+# PATH  uint32 index per room into the distinct paths listed in META
+# VISI  int64 visitor numbers, non-int values are listed in META
+# STAT  uint8 index per room into the guest statuses listed in META
+# PRIM  uint64 prime table
+_MAGIC = b'HHSNAP02'
+_SECTION = struct.Struct('<4s4xQ')
+_LAYOUTS = {_MAGIC: _SECTION, b'HHSNAP01': struct.Struct('<4sQ')} # 01: 12 byte headers, still read
+_KEY_INT = 0
+_KEY_PRIME_POWERS = 1
+
+def _write_section(f, tag: bytes, payload):
+    payload = memoryview(payload).cast('B')
+    f.write(_SECTION.pack(tag, len(payload)))
+    f.write(payload)
+    f.write(b'\0' * (-len(payload) % 8))
+
+def _encode_keys(keys):
+    # array('q') would take a PrimePowerKey through __index__ and reload it as a plain int
+    if all(type(key) is int and -2**63 <= key < 2**63 for key in keys):
+        return 'int64', array('q', keys)
+    records = bytearray()
+    for key in keys:
+        if isinstance(key, PrimePowerKey):
+            records += struct.pack('<BI', _KEY_PRIME_POWERS, len(key.exponents))
+            records += array('I', key.exponents).tobytes()
+        else:
+            raw = key.to_bytes((key.bit_length() + 8) // 8, 'little', signed=True)
+            records += struct.pack('<BI', _KEY_INT, len(raw)) + raw
+    return 'records', records
+
+def _decode_keys(encoding, buffer, count):
+    if encoding == 'int64':
+        return _native(buffer, 'q').tolist()
+    keys = []
+    offset = 0
+    for _ in range(count):
+        tag, length = struct.unpack_from('<BI', buffer, offset)
+        offset += 5
+        if tag == _KEY_PRIME_POWERS:
+            keys.append(PrimePowerKey(_native(buffer[offset:offset + 4 * length], 'I').tolist()))
+            offset += 4 * length
+        else:
+            keys.append(int.from_bytes(buffer[offset:offset + length], 'little', signed=True))
+            offset += length
+    return keys
+
+def _native(buffer, typecode):
+    # columns are written little-endian
+    if sys.byteorder == 'little':
+        return memoryview(buffer).cast('B').cast(typecode)
+    column = array(typecode, bytes(buffer))
+    column.byteswap()
+    return column
+
+def _cohort_to_dict(cohort: Cohort) -> dict:
+    # scale and offset grow past what json can print as decimals
+    return {
+        'stride': cohort.stride, 'residues': cohort.residues, 'count': cohort.count,
+        'radices': list(cohort.radices), 'scale': hex(cohort.scale), 'offset': hex(cohort.offset),
+        'shifted': cohort.shifted, 'removed': cohort.removed, 'cut': [list(rule) for rule in cohort.cut],
+    }
+
+def _cohort_from_dict(data: dict) -> Cohort:
+    cohort = Cohort(data['stride'], data['residues'], data['count'], tuple(data['radices']))
+    cohort.scale = int(data['scale'], 16)
+    cohort.offset = int(data['offset'], 16)
+    cohort.shifted = data['shifted']
+    cohort.removed = sorted(data['removed'])
+    cohort.cut = [tuple(rule) for rule in data.get('cut', [])] # files from before delete_cohort have none
+    return cohort
+
+def save_snapshot(hotel, path: str) -> int:
+    keys = []
+    path_ids = array('I')
+    visitor_numbers = array('q')
+    statuses = array('B')
+    path_table, status_table = {}, {}
+    visitor_exceptions = {}
+
+    for index, room in enumerate(hotel.rooms.iter_inorder()):
+        keys.append(room.room_number)
+        visitor_path = room.visitor_path
+        hashable_path = tuple(visitor_path) if isinstance(visitor_path, list) else visitor_path
+        path_ids.append(path_table.setdefault(hashable_path, len(path_table)))
+        visitor_number = room.visitor_number
+        if isinstance(visitor_number, int) and -2**63 <= visitor_number < 2**63:
+            visitor_numbers.append(visitor_number)
+        else:
+            visitor_numbers.append(0)
+            visitor_exceptions[index] = visitor_number
+        statuses.append(status_table.setdefault(room.guest_status, len(status_table)))
+
+    key_encoding, key_column = _encode_keys(keys)
+    primes = hotel.primes
+    meta = {
+        'total_guests': hotel.total_guests,
+        'journal_sequence': hotel.journal_sequence,
+        'room_count': len(keys),
+        'symbolic_cohorts': hotel.symbolic_cohorts,
+        'key_encoding': key_encoding,
+        'paths': list(path_table),
+        'statuses': list(status_table),
+        'visitor_exceptions': visitor_exceptions,
+        'prime_limit': primes.limit,
+        'cohorts': [_cohort_to_dict(cohort) for cohort in hotel.cohorts],
+    }
+    columns = [key_column, path_ids, visitor_numbers, statuses]
+    if sys.byteorder != 'little':
+        for column in columns:
+            if isinstance(column, array):
+                column.byteswap()
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb', buffering=1 << 20) as f:
+        f.write(_MAGIC)
+        _write_section(f, b'META', json.dumps(meta).encode('utf-8'))
+        _write_section(f, b'KEYS', key_column)
+        _write_section(f, b'PATH', path_ids)
+        _write_section(f, b'VISI', visitor_numbers)
+        _write_section(f, b'STAT', statuses)
+        prime_column = array('Q', primes.primes) if sys.byteorder != 'little' else primes.primes
+        if sys.byteorder != 'little':
+            prime_column.byteswap()
+        _write_section(f, b'PRIM', prime_column)
+        # on disk before it replaces the old one, a checkpoint truncates the journal right after
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(path)
+    return len(keys)
+
+def _section_offsets(buffer) -> dict:
+    # tag -> (payload offset, payload length)
+    header = _LAYOUTS[bytes(buffer[:len(_MAGIC)])]
+    sections = {}
+    offset = len(_MAGIC)
+    while offset < len(buffer):
+        tag, length = header.unpack_from(buffer, offset)
+        offset += header.size
+        sections[tag] = offset, length
+        offset += length + (-length % 8)
+    return sections
+
+def load_snapshot(hotel, path: str) -> int:
+    # fills an empty hotel, the file is memory-mapped and the tree is bulk built
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(_MAGIC)] not in _LAYOUTS:
+        mapped.close()
+        raise ValueError(f"{path} is not a hotel snapshot")
+
+    view = memoryview(mapped)
+    sections = {tag: view[offset:offset + length] for tag, (offset, length) in _section_offsets(mapped).items()}
+
+    meta = json.loads(bytes(sections[b'META']))
+    count = meta['room_count']
+    keys = _decode_keys(meta['key_encoding'], sections[b'KEYS'], count)
+    path_table = [tuple(p) if isinstance(p, list) else p for p in meta['paths']]
+    paths = list(map(path_table.__getitem__, _native(sections[b'PATH'], 'I')))
+    visitor_numbers = _native(sections[b'VISI'], 'q').tolist()
+    for index, value in meta['visitor_exceptions'].items():
+        visitor_numbers[int(index)] = value
+    status_table = meta['statuses']
+    statuses = list(map(status_table.__getitem__, sections[b'STAT']))
+
+    with paused_gc():
+        rooms = list(map(Room, keys, paths, visitor_numbers, statuses))
+    hotel.rooms.build_from_sorted(rooms)
+    hotel.memory.reset()
+    hotel.memory.add_sorted(rooms)
+    hotel.total_guests = meta['total_guests']
+    hotel.journal_sequence = meta.get('journal_sequence', 0) # files from before the journal have none
+    hotel.symbolic_cohorts = hotel.symbolic_cohorts or meta['symbolic_cohorts'] # --symbolic still applies
+    hotel.cohorts = [_cohort_from_dict(data) for data in meta['cohorts']]
+
+    primes = PrimeTable.from_buffer(sections[b'PRIM'], meta['prime_limit'], mapped)
+    if sys.byteorder != 'little':
+        primes.primes = _native(sections[b'PRIM'], 'Q')
+    PrimeTable.adopt(primes)
+    hotel.primes = primes
+    return count
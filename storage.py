@@ -0,0 +1,400 @@
+import gc
+import struct
+import sys
+from bisect import bisect_left, bisect_right
+from contextlib import contextmanager
+from itertools import accumulate, islice
+from typing import Optional, List
+
+from room import Room
+
+BLOCK_SIZE = 512 # rooms per block, a block is split in two once it doubles
+_POINTER_BYTES = struct.calcsize('P')
+
+@contextmanager
+def paused_gc():
+    # around bulk allocations of acyclic objects (rooms, nodes, blocks): the cyclic collector
+    # would only keep walking them, it is switched back on as it was found
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+class RoomStorage:
+    # what HilbertHotel needs from the structure holding its rooms, kept sorted by room number
+    # shifts are lazy: keys are stored as of an epoch, current room number = scale * original + offset
+    supports_snapshots = False # snapshot() gives a read-only version that later writes leave alone
+
+    def __init__(self):
+        self._scale = 1
+        self._offset = 0
+        self._epoch = 0
+        self._transforms = [(1, 0)] # (scale, offset) in effect at each epoch
+
+    def _transform(self, epoch: int):
+        # (a, b) with current room number = a * key + b for a key stored at `epoch`
+        scale, offset = self._transforms[epoch]
+        a = self._scale // scale
+        return a, self._offset - a * offset
+
+    def shift(self, n, method):
+        # O(1): compose the shift into the pending transform, stored keys catch up when touched
+        if method == 1:
+            self._offset += n
+        elif method == 2:
+            self._scale *= n
+            self._offset *= n
+        self._epoch += 1
+        self._transforms.append((self._scale, self._offset))
+
+    def change_room(self, n, method):
+        if not self.size():
+            return
+        self.shift(n, method)
+
+    def insert(self, room: Room):
+        # an occupied room number is ignored, the current guest stays
+        raise NotImplementedError
+
+    def delete(self, room_number: int):
+        raise NotImplementedError
+
+    def delete_range(self, lo, hi) -> List[Room]:
+        # removes every room with lo <= room number <= hi, returns them in order
+        rooms = list(self.iter_range(lo, hi))
+        for room in rooms:
+            self.delete(room.room_number)
+        return rooms
+
+    def search(self, room_number: int) -> Optional[Room]:
+        raise NotImplementedError
+
+    def search_sorted(self, sorted_room_numbers) -> List[Optional[Room]]:
+        # search() of every room number, which must come in ascending order,
+        # backends resume each lookup where the previous one ended
+        return [self.search(room_number) for room_number in sorted_room_numbers]
+
+    def contains_sorted(self, sorted_room_numbers) -> List[bool]:
+        return [room is not None for room in self.search_sorted(sorted_room_numbers)]
+
+    def build_from_sorted(self, sorted_rooms: List[Room]):
+        # rooms must be strictly increasing by room number, replaces the current contents
+        raise NotImplementedError
+
+    def bulk_load(self, sorted_rooms: List[Room]) -> List[Room]:
+        # returns the new rooms whose number was already taken, the existing guest stays
+        raise NotImplementedError
+
+    def iter_from(self, room_number=None):
+        # rooms in order starting at the first one >= room_number
+        raise NotImplementedError
+
+    def rank(self, room_number) -> int:
+        raise NotImplementedError
+
+    def select(self, index: int) -> Optional[Room]:
+        raise NotImplementedError
+
+    def count_range(self, lo, hi) -> int:
+        raise NotImplementedError
+
+    def height(self) -> int:
+        raise NotImplementedError
+
+    def memory_overhead(self) -> int:
+        # bytes of the structure itself, room numbers / paths / visitor numbers are not included
+        return sys.getsizeof(self) + sys.getsizeof(self._transforms) + len(self._transforms) * 64
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+    def snapshot(self) -> 'RoomStorage':
+        raise ValueError(f"{type(self).__name__} does not support snapshots")
+
+    def active_snapshots(self) -> int:
+        return 0
+
+    def iter_inorder(self):
+        return self.iter_from()
+
+    def iter_range(self, lo, hi):
+        # rooms with lo <= room number <= hi
+        for room in self.iter_from(lo):
+            if room.room_number > hi:
+                return
+            yield room
+
+class _Block:
+    # one chunk of rooms as parallel columns, keys are room numbers as of `epoch`
+    __slots__ = ['keys', 'paths', 'visitor_numbers', 'statuses', 'epoch']
+
+    def __init__(self, keys: list, paths: list, visitor_numbers: list, statuses: list, epoch: int):
+        self.keys = keys
+        self.paths = paths
+        self.visitor_numbers = visitor_numbers
+        self.statuses = statuses
+        self.epoch = epoch
+
+    def split(self, epoch: int) -> '_Block':
+        # moves the upper half into a new block
+        half = len(self.keys) // 2
+        upper = _Block(self.keys[half:], self.paths[half:], self.visitor_numbers[half:],
+                       self.statuses[half:], epoch)
+        del self.keys[half:], self.paths[half:], self.visitor_numbers[half:], self.statuses[half:]
+        return upper
+
+class BlockStorage(RoomStorage):
+    # list of sorted fixed-size blocks (SortedList style): bisect over the block maxima,
+    # then within one block, no per-room objects are kept and Rooms are built on the way out
+    def __init__(self, block_size: int = BLOCK_SIZE):
+        super().__init__()
+        if block_size < 1:
+            raise ValueError("Block size must be positive")
+        self.block_size = block_size
+        self._blocks = []
+        self._cached_size = 0
+        self._positions = None # rooms before each block, rebuilt after an edit
+
+    def _catch_up(self, block: _Block) -> _Block:
+        # apply the shifts made since the block was last touched, one pass over its keys
+        if block.epoch != self._epoch:
+            a, b = self._transform(block.epoch)
+            if b == 0:
+                block.keys = [a * key for key in block.keys]
+            else:
+                block.keys = [a * key + b for key in block.keys]
+            block.statuses = ["old"] * len(block.keys) # for visualize
+            block.epoch = self._epoch
+        return block
+
+    def _last_key(self, block: _Block):
+        key = block.keys[-1]
+        if block.epoch != self._epoch:
+            a, b = self._transform(block.epoch)
+            key = a * key + b
+        return key
+
+    def _find_block(self, room_number, lo: int = 0) -> int:
+        # first block from `lo` on whose last room is >= room_number, len(blocks) when there is none
+        blocks = self._blocks
+        hi = len(blocks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._last_key(blocks[mid]) < room_number:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _room(self, block: _Block, index: int) -> Room:
+        return Room(block.keys[index], block.paths[index], block.visitor_numbers[index], block.statuses[index])
+
+    def _edited(self):
+        self._positions = None
+
+    def insert(self, room: Room):
+        room_number = room.room_number
+        blocks = self._blocks
+        if not blocks:
+            blocks.append(_Block([room_number], [room.visitor_path], [room.visitor_number],
+                                 [room.guest_status], self._epoch))
+            self._cached_size += 1
+            self._edited()
+            return
+        i = min(self._find_block(room_number), len(blocks) - 1)
+        block = self._catch_up(blocks[i])
+        j = bisect_left(block.keys, room_number)
+        if j < len(block.keys) and block.keys[j] == room_number:
+            return # occupied
+        block.keys.insert(j, room_number)
+        block.paths.insert(j, room.visitor_path)
+        block.visitor_numbers.insert(j, room.visitor_number)
+        block.statuses.insert(j, room.guest_status)
+        if len(block.keys) > 2 * self.block_size:
+            blocks.insert(i + 1, block.split(self._epoch))
+        self._cached_size += 1
+        self._edited()
+
+    def delete(self, room_number: int):
+        i = self._find_block(room_number)
+        if i == len(self._blocks):
+            return
+        block = self._catch_up(self._blocks[i])
+        j = bisect_left(block.keys, room_number)
+        if j == len(block.keys) or block.keys[j] != room_number:
+            return
+        del block.keys[j], block.paths[j], block.visitor_numbers[j], block.statuses[j]
+        if not block.keys:
+            del self._blocks[i]
+        self._cached_size -= 1
+        self._edited()
+
+    def delete_range(self, lo, hi) -> List[Room]:
+        # the blocks at both ends are trimmed, the ones in between dropped
+        blocks = self._blocks
+        first = self._find_block(lo)
+        if hi < lo or first == len(blocks):
+            return []
+        last = min(self._find_block(hi, first), len(blocks) - 1)
+        removed, kept = [], []
+        for i in range(first, last + 1):
+            block = self._catch_up(blocks[i])
+            start = bisect_left(block.keys, lo) if i == first else 0
+            end = bisect_right(block.keys, hi) if i == last else len(block.keys)
+            removed.extend(self._room(block, j) for j in range(start, end))
+            del block.keys[start:end], block.paths[start:end]
+            del block.visitor_numbers[start:end], block.statuses[start:end]
+            if block.keys:
+                kept.append(block)
+        blocks[first:last + 1] = kept
+        self._cached_size -= len(removed)
+        self._edited()
+        return removed
+
+    def search(self, room_number: int) -> Optional[Room]:
+        i = self._find_block(room_number)
+        if i == len(self._blocks):
+            return None
+        block = self._catch_up(self._blocks[i])
+        j = bisect_left(block.keys, room_number)
+        if j < len(block.keys) and block.keys[j] == room_number:
+            return self._room(block, j)
+        return None
+
+    def _locate_sorted(self, sorted_room_numbers):
+        # (block, index) of each room number, ascending, or None: one forward pass, the block
+        # and the position inside it only move ahead
+        blocks = self._blocks
+        i, start, block, last = 0, 0, None, None
+        for room_number in sorted_room_numbers:
+            if block is None or room_number > last:
+                i = self._find_block(room_number, i)
+                if i == len(blocks):
+                    yield None
+                    continue
+                block, start = self._catch_up(blocks[i]), 0
+                last = block.keys[-1]
+            start = bisect_left(block.keys, room_number, start)
+            yield (block, start) if block.keys[start] == room_number else None
+
+    def search_sorted(self, sorted_room_numbers) -> List[Optional[Room]]:
+        return [self._room(*found) if found else None for found in self._locate_sorted(sorted_room_numbers)]
+
+    def contains_sorted(self, sorted_room_numbers) -> List[bool]:
+        return [found is not None for found in self._locate_sorted(sorted_room_numbers)]
+
+    def _rows(self):
+        for block in self._blocks:
+            self._catch_up(block)
+            yield from zip(block.keys, block.paths, block.visitor_numbers, block.statuses)
+
+    def _build_blocks(self, rows) -> List[_Block]:
+        blocks = []
+        while True:
+            chunk = list(islice(rows, self.block_size))
+            if not chunk:
+                return blocks
+            keys, paths, visitor_numbers, statuses = map(list, zip(*chunk))
+            blocks.append(_Block(keys, paths, visitor_numbers, statuses, self._epoch))
+
+    def build_from_sorted(self, sorted_rooms: List[Room]):
+        rows = ((room.room_number, room.visitor_path, room.visitor_number, room.guest_status)
+                for room in sorted_rooms)
+        self._blocks = self._build_blocks(rows)
+        self._cached_size = len(sorted_rooms)
+        self._edited()
+
+    def bulk_load(self, sorted_rooms: List[Room]) -> List[Room]:
+        if not self._blocks:
+            self.build_from_sorted(sorted_rooms)
+            return []
+        collisions = []
+        if len(sorted_rooms) * 8 < self._cached_size:
+            # a few rooms, inserting them one by one beats rewriting every block
+            for room in sorted_rooms:
+                size_before = self._cached_size
+                self.insert(room)
+                if self._cached_size == size_before:
+                    collisions.append(room)
+            return collisions
+        self._blocks = self._build_blocks(self._merge_rows(sorted_rooms, collisions))
+        self._cached_size += len(sorted_rooms) - len(collisions)
+        self._edited()
+        return collisions
+
+    def _merge_rows(self, sorted_rooms: List[Room], collisions: List[Room]):
+        # one linear pass over the stored rows and the new rooms
+        existing = self._rows()
+        current = next(existing, None)
+        for room in sorted_rooms:
+            room_number = room.room_number
+            while current is not None and current[0] < room_number:
+                yield current
+                current = next(existing, None)
+            if current is not None and current[0] == room_number:
+                collisions.append(room)
+                continue
+            yield room_number, room.visitor_path, room.visitor_number, room.guest_status
+        if current is not None:
+            yield current
+            yield from existing
+
+    def iter_from(self, room_number=None):
+        blocks = self._blocks
+        i = 0 if room_number is None else self._find_block(room_number)
+        start = None
+        while i < len(blocks):
+            block = self._catch_up(blocks[i])
+            if start is None:
+                start = 0 if room_number is None else bisect_left(block.keys, room_number)
+            for j in range(start, len(block.keys)):
+                yield self._room(block, j)
+            start = 0
+            i += 1
+
+    def _block_positions(self) -> list:
+        if self._positions is None:
+            self._positions = list(accumulate((len(block.keys) for block in self._blocks), initial=0))
+        return self._positions
+
+    def _count_below(self, room_number, inclusive: bool) -> int:
+        i = self._find_block(room_number)
+        if i == len(self._blocks):
+            return self._cached_size
+        block = self._catch_up(self._blocks[i])
+        within = bisect_right(block.keys, room_number) if inclusive else bisect_left(block.keys, room_number)
+        return self._block_positions()[i] + within
+
+    def rank(self, room_number) -> int:
+        return self._count_below(room_number, False)
+
+    def select(self, index: int) -> Optional[Room]:
+        if index < 0 or index >= self._cached_size:
+            return None
+        positions = self._block_positions()
+        i = bisect_right(positions, index) - 1
+        return self._room(self._catch_up(self._blocks[i]), index - positions[i])
+
+    def count_range(self, lo, hi) -> int:
+        if hi < lo:
+            return 0
+        return self._count_below(hi, True) - self._count_below(lo, False)
+
+    def height(self) -> int:
+        # the block list, then one block
+        return 2 if self._blocks else 0
+
+    def blocks(self) -> int:
+        return len(self._blocks)
+
+    def memory_overhead(self) -> int:
+        # four column slots per room (lists over-allocate ~1/8), four lists per block
+        per_block = sys.getsizeof(_Block.__new__(_Block)) + 4 * sys.getsizeof([])
+        return (super().memory_overhead() + sys.getsizeof(self._blocks)
+                + len(self._blocks) * per_block + self._cached_size * 4 * _POINTER_BYTES * 9 // 8)
+
+    def size(self) -> int:
+        return self._cached_size
@@ -0,0 +1,91 @@
+import random
+
+from HilbertHotel import HilbertHotel
+from replay import batch_total
+
+# a symbolic hotel against one with every guest in the tree, they must never tell apart
+
+def _rooms(hotel):
+    return [(room.room_number, tuple(room.visitor_path), room.visitor_number) for room in hotel.iter_rooms()]
+
+def _check_same(materialized, symbolic):
+    assert _rooms(symbolic) == _rooms(materialized)
+    assert symbolic.total_rooms() == materialized.total_rooms()
+    assert symbolic.total_guests == materialized.total_guests
+    rooms = _rooms(materialized)
+    top = rooms[-1][0] + 3 if rooms else 3
+    for room_number in range(0, top, 2):
+        assert symbolic.rank_room(room_number) == materialized.rank_room(room_number)
+        assert symbolic.count_range(1, room_number) == materialized.count_range(1, room_number)
+        assert symbolic.contains(room_number) == materialized.contains(room_number)
+    for index in range(len(rooms)):
+        assert symbolic.select_room(index).room_number == rooms[index][0]
+
+def test_random_operations_match_materialized_hotel():
+    rng = random.Random(7)
+    for _ in range(40):
+        materialized = HilbertHotel(verbose=False)
+        symbolic = HilbertHotel(symbolic_cohorts=True, verbose=False)
+        hotels = (materialized, symbolic)
+        for _ in range(rng.randint(2, 6)):
+            choice = rng.random()
+            rooms = [room[0] for room in _rooms(materialized)]
+            if choice < 0.35 or not rooms:
+                amounts = [rng.randint(1, 4) for _ in range(rng.randint(1, 5))]
+                for hotel in hotels:
+                    hotel.add_batch_visitors(batch_total(*amounts), *amounts)
+            elif choice < 0.55:
+                room_number = rng.choice(rooms)
+                for hotel in hotels:
+                    hotel.delete_manual(room_number)
+            elif choice < 0.7:
+                lo = rng.choice(rooms)
+                hi = lo + rng.randint(0, 30)
+                assert symbolic.delete_range(lo, hi) == materialized.delete_range(lo, hi)
+            elif choice < 0.75:
+                room_number = rng.randint(1, 200)
+                if not materialized.contains(room_number):
+                    for hotel in hotels:
+                        hotel.add_manual(room_number, (0, 0, 1, 1), 7)
+            else:
+                prefix = tuple(rng.choice([0, 0, 1, 2, 3]) for _ in range(rng.randint(1, 5)))
+                assert symbolic.delete_cohort(prefix) == materialized.delete_cohort(prefix)
+            _check_same(materialized, symbolic)
+
+def test_nested_path_deletes():
+    # a wider prefix takes over the guests of a narrower one and the holes under it
+    for prefixes in ([(0, 3, 2), (0, 3)], [(0, 3), (0, 3, 2)], [(0, 2, 1), (0, 2, 3), (0, 2)]):
+        materialized = HilbertHotel(verbose=False)
+        symbolic = HilbertHotel(symbolic_cohorts=True, verbose=False)
+        for hotel in (materialized, symbolic):
+            hotel.add_batch_visitors(batch_total(3, 4, 5, 3), 3, 4, 5, 3)
+        for room in _rooms(materialized)[::7]:
+            materialized.delete_manual(room[0])
+            symbolic.delete_manual(room[0])
+        for prefix in prefixes:
+            assert symbolic.delete_cohort(prefix) == materialized.delete_cohort(prefix)
+        _check_same(materialized, symbolic)
+
+def test_path_delete_does_not_list_guests():
+    hotel = HilbertHotel(symbolic_cohorts=True, verbose=False)
+    hotel.add_batch_visitors(10**6 * 50 * 40, 10**6, 50, 40)
+    assert hotel.delete_cohort((0, 0, 3)) == 10**6 * 50
+    assert hotel.delete_cohort((0, 0, 4, 7)) == 10**6
+    assert hotel.total_rooms() == 10**6 * 50 * 40 - 51 * 10**6
+
+def test_pages_mixed_with_prime_power_rooms():
+    # cohorts are asked to start at exponent-vector room numbers of an infinite hierarchy
+    hotel = HilbertHotel(symbolic_cohorts=True, verbose=False)
+    hotel.add_batch_visitors(3, 3)
+    hotel.add_infinite(2, [2, 2])
+    hotel.add_batch_visitors(batch_total(2, 2), 2, 2)
+    numbers = [room[0] for room in _rooms(hotel)]
+    assert any(not isinstance(room_number, int) for room_number in numbers)
+    for start in range(len(numbers)):
+        for page_size in (1, 3, len(numbers)):
+            page = [room.room_number for room in hotel.get_page(start, page_size)]
+            assert page == numbers[start:start + page_size]
+    for i, lo in enumerate(numbers):
+        assert [room.room_number for room in hotel.iter_range(lo, numbers[-1])] == numbers[i:]
+    assert hotel.delete_range(numbers[1], numbers[-2]) == len(numbers) - 2
+    assert [room[0] for room in _rooms(hotel)] == [numbers[0], numbers[-1]]
@@ -0,0 +1,142 @@
+import os
+import random
+
+import pytest
+
+from HilbertHotel import HilbertHotel
+from persistent import PersistentAVLTree
+from replay import batch_total
+from storage import BlockStorage
+
+# a hotel recovered from its snapshot and journal against the one that wrote them
+
+def _rooms(hotel):
+    return [(room.room_number, room.visitor_path, room.visitor_number) for room in hotel.iter_rooms()]
+
+def _state(hotel):
+    return _rooms(hotel), hotel.total_guests, hotel.journal_sequence
+
+def _random_operation(rng, hotel):
+    # (method, arguments) of an operation that changes the hotel as it is now
+    rooms = [room[0] for room in _rooms(hotel)]
+    choice = rng.random()
+    if choice < 0.3 or not rooms:
+        amounts = [rng.randint(1, 4) for _ in range(rng.randint(1, 4))]
+        return 'add_batch_visitors', (batch_total(*amounts), *amounts)
+    if choice < 0.4:
+        return 'add_infinite', (2, [rng.randint(1, 3), rng.randint(1, 3)])
+    if choice < 0.55:
+        room_number = rng.randint(1, 400)
+        while hotel.contains(room_number):
+            room_number += 1
+        return 'add_manual', (room_number, rng.choice(["Manual entry", (0, 0, 1, 1)]), rng.randint(1, 9))
+    if choice < 0.7:
+        return 'delete_manual', (rng.choice(rooms),)
+    if choice < 0.85:
+        first = rng.randrange(len(rooms))
+        return 'delete_range', (rooms[first], rooms[min(len(rooms) - 1, first + rng.randint(0, 5))])
+    paths = [room[1] for room in _rooms(hotel) if isinstance(room[1], tuple)]
+    if not paths:
+        return 'delete_manual', (rng.choice(rooms),)
+    path = rng.choice(paths)
+    return 'delete_cohort', (path[:rng.randint(1, len(path))],)
+
+def _apply(hotel, operation):
+    method, args = operation
+    getattr(hotel, method)(*args)
+
+STORAGES = [None, lambda: BlockStorage(block_size=8), PersistentAVLTree]
+
+@pytest.mark.parametrize("make_storage", STORAGES, ids=["avl", "block", "persistent"])
+@pytest.mark.parametrize("symbolic", [False, True], ids=["stored", "symbolic"])
+@pytest.mark.parametrize("compact_every, sync_interval", [(0, 0.0), (3, 0.0), (4, 0.05)],
+                         ids=["log-only", "checkpoint", "group-commit"])
+def test_recovered_hotel_matches_live_hotel(tmp_path, make_storage, symbolic, compact_every, sync_interval):
+    journal_path, snapshot_path = str(tmp_path / "hotel.log"), str(tmp_path / "hotel.snap")
+    options = dict(symbolic_cohorts=symbolic, compact_every=compact_every, sync_interval=sync_interval,
+                   verbose=False)
+    storage = lambda: make_storage() if make_storage else None
+    rng = random.Random(hash((symbolic, compact_every)) & 0xFFFF)
+    hotel = HilbertHotel.recover(journal_path, snapshot_path, storage(), **options)
+    for _ in range(40):
+        _apply(hotel, _random_operation(rng, hotel))
+        if compact_every:
+            assert hotel.journal.records_since_base() < compact_every
+        if rng.random() < 0.25:
+            live = _state(hotel)
+            hotel.journal.close()
+            hotel = HilbertHotel.recover(journal_path, snapshot_path, storage(), **options)
+            assert _state(hotel) == live
+    if compact_every:
+        assert os.path.exists(snapshot_path)
+    hotel.journal.close()
+
+@pytest.mark.parametrize("damage", ["truncate", "corrupt"])
+def test_recovery_drops_damaged_tail_record(tmp_path, damage):
+    # a crash in the middle of an append leaves a partial or garbled last record, recovery
+    # ends at the record before it and the journal goes on from there
+    journal_path = str(tmp_path / "hotel.log")
+    rng = random.Random(11)
+    for _ in range(15):
+        os.path.exists(journal_path) and os.remove(journal_path)
+        hotel = HilbertHotel.recover(journal_path, verbose=False)
+        for _ in range(rng.randint(0, 8)):
+            _apply(hotel, _random_operation(rng, hotel))
+        before, size = _state(hotel), os.path.getsize(journal_path)
+        _apply(hotel, _random_operation(rng, hotel))
+        hotel.journal.close()
+        end = os.path.getsize(journal_path)
+        assert end > size
+        with open(journal_path, 'r+b') as f:
+            if damage == "truncate":
+                f.truncate(rng.randrange(size, end))
+            else:
+                f.seek(rng.randrange(size, end))
+                byte = f.read(1)
+                f.seek(-1, os.SEEK_CUR)
+                f.write(bytes([byte[0] ^ 0xFF]))
+
+        hotel = HilbertHotel.recover(journal_path, verbose=False)
+        assert _state(hotel) == before
+        assert os.path.getsize(journal_path) == size
+        _apply(hotel, _random_operation(rng, hotel))
+        live = _state(hotel)
+        hotel.journal.close()
+        hotel = HilbertHotel.recover(journal_path, verbose=False)
+        assert _state(hotel) == live
+        hotel.journal.close()
+
+def test_recovery_from_snapshot_newer_than_journal(tmp_path):
+    # the log was lost after a checkpoint, the hotel starts from the snapshot and journals on
+    journal_path, snapshot_path = str(tmp_path / "hotel.log"), str(tmp_path / "hotel.snap")
+    rng = random.Random(5)
+    hotel = HilbertHotel.recover(journal_path, snapshot_path, verbose=False)
+    for _ in range(10):
+        _apply(hotel, _random_operation(rng, hotel))
+    assert hotel.checkpoint()
+    live = _state(hotel)
+    hotel.journal.close()
+    os.remove(journal_path)
+
+    hotel = HilbertHotel.recover(journal_path, snapshot_path, verbose=False)
+    assert _state(hotel) == live
+    for _ in range(5):
+        _apply(hotel, _random_operation(rng, hotel))
+    live = _state(hotel)
+    hotel.journal.close()
+    hotel = HilbertHotel.recover(journal_path, snapshot_path, verbose=False)
+    assert _state(hotel) == live
+    hotel.journal.close()
+
+def test_recover_refuses_journal_compacted_past_missing_snapshot(tmp_path):
+    journal_path, snapshot_path = str(tmp_path / "hotel.log"), str(tmp_path / "hotel.snap")
+    hotel = HilbertHotel.recover(journal_path, snapshot_path, compact_every=2, verbose=False)
+    hotel.add_batch_visitors(5, 5)
+    hotel.add_batch_visitors(3, 3)
+    hotel.add_manual(100, "Manual entry", 1)
+    assert hotel.total_rooms() == 9
+    hotel.journal.close()
+
+    os.remove(snapshot_path)
+    with pytest.raises(ValueError, match="compacted"):
+        HilbertHotel.recover(journal_path, snapshot_path, verbose=False)
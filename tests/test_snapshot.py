@@ -0,0 +1,58 @@
+import struct
+
+from HilbertHotel import HilbertHotel
+from room_key import PrimePowerKey
+import snapshot
+
+def _keys(hotel):
+    return [room.room_number for room in hotel.iter_rooms()]
+
+def test_round_trip_keeps_key_types(tmp_path):
+    hotel = HilbertHotel(verbose=False)
+    hotel.add_batch_visitors(5, 5)
+    hotel.add_infinite(2, [3, 3])
+    path = str(tmp_path / "hotel.snap")
+    assert hotel.save_snapshot(path)
+    loaded = HilbertHotel.load_snapshot(path, verbose=False)
+    before, after = _keys(hotel), _keys(loaded)
+    assert after == before
+    assert [type(key) for key in after] == [type(key) for key in before]
+    assert any(isinstance(key, PrimePowerKey) for key in after)
+
+def test_round_trip_int_keys(tmp_path):
+    hotel = HilbertHotel(verbose=False)
+    hotel.add_batch_visitors(60, 3, 4, 5)
+    hotel.add_manual(2**70, "Manual entry", 1)
+    path = str(tmp_path / "hotel.snap")
+    assert hotel.save_snapshot(path)
+    loaded = HilbertHotel.load_snapshot(path, verbose=False)
+    assert _keys(loaded) == _keys(hotel)
+    assert all(type(key) is int for key in _keys(loaded))
+    assert loaded.total_guests == hotel.total_guests
+
+def test_columns_are_aligned(tmp_path):
+    hotel = HilbertHotel(verbose=False)
+    hotel.add_batch_visitors(21, 3, 7)
+    hotel.add_manual(5000, "Manual entry", 3) # odd-sized META and STAT payloads
+    path = str(tmp_path / "hotel.snap")
+    assert hotel.save_snapshot(path)
+    with open(path, 'rb') as f:
+        sections = snapshot._section_offsets(f.read())
+    assert set(sections) == {b'META', b'KEYS', b'PATH', b'VISI', b'STAT', b'PRIM'}
+    assert all(offset % 8 == 0 for offset, _ in sections.values())
+
+def test_reads_unaligned_layout(tmp_path):
+    # files written before the section headers were padded
+    hotel = HilbertHotel(verbose=False)
+    hotel.add_batch_visitors(12, 3, 4)
+    path = str(tmp_path / "hotel.snap")
+    assert hotel.save_snapshot(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    old = bytearray(b'HHSNAP01')
+    for tag, (offset, length) in snapshot._section_offsets(data).items():
+        old += struct.pack('<4sQ', tag, length) + data[offset:offset + length] + b'\0' * (-length % 8)
+    with open(path, 'wb') as f:
+        f.write(old)
+    loaded = HilbertHotel.load_snapshot(path, verbose=False)
+    assert _keys(loaded) == _keys(hotel)
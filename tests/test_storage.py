@@ -0,0 +1,96 @@
+import random
+
+import pytest
+
+from HilbertHotel import HilbertHotel
+from bloom import MembershipFilter
+from persistent import PersistentAVLTree
+from replay import batch_total
+from storage import BlockStorage
+
+from test_journal import _apply, _random_operation, _rooms
+
+# every backend, with or without a membership filter, must answer like the plain AVL tree
+
+STORAGES = {
+    'block': lambda: BlockStorage(block_size=8),
+    'persistent': PersistentAVLTree,
+}
+
+def _misses(rooms):
+    top = rooms[-1][0] if rooms else 0
+    numbers = [room_number for room_number in range(1, 120)] + [top + 1, top + 1000]
+    return [room_number for room_number in numbers if room_number not in {room[0] for room in rooms}]
+
+@pytest.mark.parametrize("fp_rate", [None, 0.01, 0.3], ids=["no-filter", "filter", "leaky-filter"])
+def test_backends_and_filter_answer_like_avl_tree(fp_rate):
+    rng = random.Random(3)
+    for _ in range(10):
+        reference = HilbertHotel(verbose=False)
+        others = [HilbertHotel(storage=make(), verbose=False,
+                               membership_filter=MembershipFilter(fp_rate) if fp_rate else None)
+                  for make in STORAGES.values()]
+        others.append(HilbertHotel(verbose=False, membership_filter=MembershipFilter(fp_rate) if fp_rate else None))
+        for _ in range(rng.randint(3, 12)):
+            operation = _random_operation(rng, reference)
+            for hotel in [reference, *others]:
+                _apply(hotel, operation)
+            rooms = _rooms(reference)
+            probes = [room[0] for room in rooms] + _misses(rooms)
+            rng.shuffle(probes)
+            expected, hits, misses = reference.search_many(probes)
+            for hotel in others:
+                assert _rooms(hotel) == rooms
+                assert hotel.total_guests == reference.total_guests
+                found, found_hits, found_misses = hotel.search_many(probes)
+                assert [room and room.room_number for room in found] == [room and room.room_number for room in expected]
+                assert (found_hits, found_misses) == (hits, misses)
+                assert hotel.contains_many(probes)[0] == [room is not None for room in expected]
+                for room_number in probes[:20]:
+                    assert hotel.contains(room_number) == (reference.search_room(room_number) is not None)
+
+@pytest.mark.parametrize("make_storage", [None, *STORAGES.values()], ids=["avl", *STORAGES])
+def test_delete_cohort_deletes_one_by_one_or_rebuilds(make_storage, monkeypatch):
+    # a single bus takes the per-room deletes, the whole batch the rebuild from the remaining rooms,
+    # where a ship lands depends on the height of the backend
+    for prefix, rebuilds in [((0, 0, 2, 3), False), ((0, 0, 2), None), ((0,), True)]:
+        hotel = HilbertHotel(storage=make_storage() if make_storage else None, verbose=False)
+        hotel.add_batch_visitors(batch_total(20, 6, 3), 20, 6, 3)
+        hotel.add_manual(10**6, "Manual entry", 1)
+        rooms = _rooms(hotel)
+        builds = []
+        build_from_sorted = hotel.rooms.build_from_sorted
+        monkeypatch.setattr(hotel.rooms, 'build_from_sorted',
+                            lambda sorted_rooms: builds.append(len(sorted_rooms)) or build_from_sorted(sorted_rooms))
+        kept = [room for room in rooms if not (isinstance(room[1], tuple) and room[1][:len(prefix)] == prefix)]
+        assert hotel.delete_cohort(prefix) == len(rooms) - len(kept)
+        assert rebuilds is None or bool(builds) == rebuilds
+        assert _rooms(hotel) == kept
+        assert hotel.total_rooms() == hotel.rooms.size() == len(kept)
+        assert [hotel.rank_room(room[0]) for room in kept] == list(range(len(kept)))
+
+def test_snapshots_keep_their_version_under_writes():
+    # copy-on-write: every open snapshot reads the rooms as they were when it was taken, whatever
+    # was inserted, deleted or shifted since
+    rng = random.Random(9)
+    hotel = HilbertHotel(storage=PersistentAVLTree(), verbose=False)
+    snapshots = []
+    for _ in range(60):
+        _apply(hotel, _random_operation(rng, hotel))
+        if rng.random() < 0.3:
+            view = hotel.rooms.snapshot()
+            snapshots.append((view, _rooms(hotel)))
+        if snapshots and rng.random() < 0.15:
+            view, _ = snapshots.pop(rng.randrange(len(snapshots)))
+            view.release()
+        for view, rooms in snapshots:
+            assert [(room.room_number, room.visitor_path, room.visitor_number) for room in view.iter_from()] == rooms
+            assert view.size() == len(rooms)
+            if rooms:
+                assert view.search(rooms[-1][0]).visitor_number == rooms[-1][2]
+        assert hotel.rooms.active_snapshots() == len(snapshots)
+    with pytest.raises(ValueError, match="read-only"):
+        snapshots[0][0].insert(hotel.rooms.select(0))
+    for view, _ in snapshots:
+        view.release()
+    assert hotel.rooms.active_snapshots() == 0